@@ -1,15 +1,8 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import joblib
-import lightgbm as lgb
-import matplotlib.pyplot as plt
-from geopy.distance import geodesic
-import json
-import os
 from datetime import datetime
-import shutil
-from pathlib import Path
+# Only what the login page needs is imported up front; the rest loads after login
+from user_store import get_user_store
+from timing import get_timings
 
 
 if 'authenticated' not in st.session_state:
@@ -29,91 +22,16 @@ VALID_PASSWORD = "admin123"
 USERS_FILE = "users.json"
 FRAUD_METRICS_FILE = "fraud_metrics.json"
 CHECKS_HISTORY_FILE = "fraud_checks_history.json"
+CHECKS_HISTORY_DIR = "fraud_checks_history"
 UPLOADS_DIR = "document_uploads"
+TRANSACTIONS_LOG_FILE = "transactions_log.csv"
 
-# Create uploads directory if it doesn't exist
-os.makedirs(UPLOADS_DIR, exist_ok=True)
+# Per-stage timing spans, shown in System Settings and exported for Prometheus
+timings = get_timings()
 
-# Load fraud metrics
-def load_fraud_metrics():
-    with open(FRAUD_METRICS_FILE, 'r') as f:
-        return json.load(f)
-
-# Save check history
-def save_check_history(check_data):
-    if os.path.exists(CHECKS_HISTORY_FILE):
-        with open(CHECKS_HISTORY_FILE, 'r') as f:
-            history = json.load(f)
-    else:
-        history = []
-    
-    history.append(check_data)
-    
-    with open(CHECKS_HISTORY_FILE, 'w') as f:
-        json.dump(history, f, indent=4)
-
-# Document handling functions
-def save_uploaded_file(uploaded_file, transaction_id, document_type):
-    """Save uploaded document with proper naming and organization"""
-    if uploaded_file is not None:
-        # Create transaction directory
-        transaction_dir = os.path.join(UPLOADS_DIR, transaction_id)
-        os.makedirs(transaction_dir, exist_ok=True)
-        
-        # Save file with proper extension
-        file_extension = Path(uploaded_file.name).suffix
-        file_path = os.path.join(transaction_dir, f"{document_type}{file_extension}")
-        
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        return file_path
-    return None
-
-def verify_document(file_path):
-    """Basic document verification (can be enhanced with actual document verification logic)"""
-    if file_path and os.path.exists(file_path):
-        # Get file size
-        file_size = os.path.getsize(file_path)
-        
-        # Basic checks
-        is_valid = True
-        issues = []
-        
-        # Check file size (max 10MB)
-        if file_size > 10 * 1024 * 1024:
-            is_valid = False
-            issues.append("File size exceeds 10MB limit")
-        
-        # Check file extension
-        allowed_extensions = ['.pdf', '.jpg', '.jpeg', '.png']
-        if not any(file_path.lower().endswith(ext) for ext in allowed_extensions):
-            is_valid = False
-            issues.append("Invalid file format. Allowed formats: PDF, JPG, JPEG, PNG")
-        
-        return {
-            "is_valid": is_valid,
-            "issues": issues,
-            "file_size": file_size,
-            "file_path": file_path
-        }
-    return {
-        "is_valid": False,
-        "issues": ["No file uploaded"],
-        "file_size": 0,
-        "file_path": None
-    }
-
-# Load or create users file
-def load_users():
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'r') as f:
-            return json.load(f)
-    return {"admin": {"password": "admin123", "role": "admin"}}
-
-def save_users(users):
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f)
+# Login accounts: cached in process, written atomically under a file lock
+user_store = get_user_store(USERS_FILE)
+USERS_PAGE_SIZE = 50
 
 # Login/Signup page
 if not st.session_state.authenticated:
@@ -129,11 +47,12 @@ if not st.session_state.authenticated:
             password = st.text_input("Password", type="password", key="login_password")
             
             if st.button("Login"):
-                users = load_users()
-                if username in users and users[username]["password"] == password:
+                with timings.span("user_lookup"):
+                    user = user_store.authenticate(username, password)
+                if user is not None:
                     st.session_state.authenticated = True
                     st.session_state.current_user = username
-                    st.session_state.is_admin = users[username]["role"] == "admin"
+                    st.session_state.is_admin = user["role"] == "admin"
                     st.rerun()
                 else:
                     st.error("Invalid username or password")
@@ -152,23 +71,86 @@ if not st.session_state.authenticated:
                 elif len(new_password) < 6:
                     st.error("Password must be at least 6 characters long!")
                 else:
-                    users = load_users()
-                    if new_username in users:
+                    if not user_store.add(new_username, new_password, "user"):
                         st.error("Username already exists!")
                     else:
-                        users[new_username] = {"password": new_password, "role": "user"}
-                        save_users(users)
                         st.success("Account created successfully! Please login.")
     
     st.stop()
 
-# Load model and encoders
-model = joblib.load("real_estate_fraud_model.jb")
-encoder = joblib.load("real_estate_label_encoders.jb")
+# Application modules, imported on the first render after login (cached by Python afterwards)
+with timings.span("import_app_modules"):
+    import pandas as pd
+    from fraud_engine import score_transaction
+    from rule_plan import get_rule_plan
+    from geo import distance_km
+    from check_history import get_history_log, migrate_json_history, save_checks
+    from buyer_index import get_buyer_index, normalize_ssn
+    from identity_index import get_identity_index
+    from risk_zones import get_risk_zones
+    from document_store import get_document_store
+    from document_verifier import get_verification_pool, transaction_key
+    from transaction_store import get_transaction_store
+    from memo import get_memo, memo_stats
+    from drift_monitor import MONITORED_CHECKS, get_drift_monitor
+
+# Bounded LRU caches shared by all sessions; keys carry a fingerprint of the source data
+distance_memo = get_memo("distance")
+check_memo = get_memo("rule_checks")
+prediction_memo = get_memo("ml_probability")
+chart_memo = get_memo("charts", maxsize=64)
+filtered_summary_memo = get_memo("filtered_summary", maxsize=256)
+
+# Load fraud metrics (compiled once, recompiled only when the file changes)
+def load_rule_plan():
+    with timings.span("metrics_load"):
+        return get_rule_plan(FRAUD_METRICS_FILE)
+
+# Incremental load of the transaction CSV into the columnar store
+def ingest_transactions():
+    with timings.span("csv_load"):
+        transaction_store.ingest_csv(TRANSACTIONS_LOG_FILE)
+
+# Check history is an append-only log; the legacy JSON array file is imported once
+history_log = get_history_log(CHECKS_HISTORY_DIR)
+migrate_json_history(CHECKS_HISTORY_FILE, history_log)
+
+# Per-buyer transaction counts for the buyer history check
+buyer_index = get_buyer_index()
+
+# SSN / name / address / seller cross-references for the identity collision check
+identity_index = get_identity_index()
+
+# Streaming quantile sketches of each check's values, per property type and month
+drift_monitor = get_drift_monitor()
+
+# High-risk zone polygons for the location risk check (reloaded in the background)
+risk_zones = get_risk_zones()
+
+# Save check history (a batch upload is saved with one write to the log and each index)
+def save_check_histories(records):
+    with timings.span("history_write"):
+        save_checks(records, history_log, buyer_index, identity_index, drift_monitor)
+
+def save_check_history(check_data):
+    save_check_histories([check_data])
+
+# Document handling: uploads are stored once per content hash and verified once
+document_store = get_document_store(UPLOADS_DIR)
 
-# Function to calculate distance
+# Deep verification (magic bytes, structure, reuse fingerprints) runs on a worker pool
+verification_pool = get_verification_pool()
+
+# Function to calculate distance (exact geodesic for single interactive checks)
 def haversine(lat1, lon1, lat2, lon2):
-    return geodesic((lat1, lon1), (lat2, lon2)).km
+    with timings.span("geodesic"):
+        return distance_memo.get_or_compute(
+            (lat1, lon1, lat2, lon2),
+            lambda: distance_km(lat1, lon1, lat2, lon2, mode="exact")
+        )
+
+# Columnar copy of the transaction log; dashboards read its precomputed aggregates
+transaction_store = get_transaction_store()
 
 # Add logout button in the sidebar
 with st.sidebar:
@@ -183,18 +165,22 @@ with st.sidebar:
 
 # Admin Dashboard
 if st.session_state.is_admin:
+    with timings.span("import_admin_modules"):
+        from rescoring import get_rescoring_job, list_versions
+        from what_if import get_what_if
+    
     st.title("👑 Admin Dashboard")
     
     admin_tab1, admin_tab2, admin_tab3, admin_tab4 = st.tabs(["User Management", "Fraud Analysis", "System Settings", "Fraud Metrics"])
     
     with admin_tab1:
         st.header("User Management")
-        users = load_users()
-        user_df = pd.DataFrame([
-            {"Username": username, "Role": data["role"]}
-            for username, data in users.items()
-        ])
-        st.dataframe(user_df)
+        total_users = len(user_store)
+        page_count = max(1, -(-total_users // USERS_PAGE_SIZE))
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key="users_page")
+        user_page = user_store.page((page - 1) * USERS_PAGE_SIZE, USERS_PAGE_SIZE)
+        st.dataframe(pd.DataFrame(user_page, columns=["Username", "Role"]))
+        st.caption(f"Page {page} of {page_count} ({total_users} users)")
         
         st.subheader("Add New User")
         new_admin_username = st.text_input("Username", key="admin_new_username")
@@ -203,8 +189,7 @@ if st.session_state.is_admin:
         
         if st.button("Add User"):
             if new_admin_username and new_admin_password:
-                users[new_admin_username] = {"password": new_admin_password, "role": new_admin_role}
-                save_users(users)
+                user_store.add(new_admin_username, new_admin_password, new_admin_role, overwrite=True)
                 st.success("User added successfully!")
                 st.rerun()
             else:
@@ -213,13 +198,14 @@ if st.session_state.is_admin:
     with admin_tab2:
         st.header("Fraud Analysis")
         try:
-            df = pd.read_csv("transactions_log.csv")
+            ingest_transactions()
             st.subheader("Fraud Statistics")
             
             # Overall statistics
-            total_transactions = len(df)
-            fraud_transactions = df["fraudulent"].sum()
-            fraud_rate = (fraud_transactions / total_transactions) * 100
+            summary = transaction_store.summary()
+            total_transactions = summary["total_transactions"]
+            fraud_transactions = summary["fraud_transactions"]
+            fraud_rate = summary["fraud_rate"]
             
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -231,16 +217,70 @@ if st.session_state.is_admin:
             
             # Detailed analysis
             st.subheader("Fraud Patterns")
-            if "month" in df.columns:
-                monthly_fraud = df[df["fraudulent"] == 1].groupby("month").size()
+            if transaction_store.has_month_data():
+                monthly_fraud = transaction_store.monthly_fraud_counts()
                 st.line_chart(monthly_fraud)
             
             # Property type analysis
-            property_fraud = df.groupby("property_type")["fraudulent"].agg(["count", "sum"])
-            property_fraud["fraud_rate"] = (property_fraud["sum"] / property_fraud["count"]) * 100
+            property_summary = transaction_store.property_type_summary()
+            property_fraud = pd.DataFrame({
+                "count": property_summary["Total Transactions"],
+                "sum": property_summary["Fraud Cases"],
+                "fraud_rate": property_summary["Fraud Cases"] / property_summary["Total Transactions"] * 100
+            })
             st.subheader("Fraud by Property Type")
             st.dataframe(property_fraud)
             
+            # Transaction explorer: filters, sort and paging run against the Parquet store,
+            # so only the requested page and its counts are read from disk
+            st.subheader("Transaction Explorer")
+            available_columns = transaction_store.column_names()
+            filter_col1, filter_col2, filter_col3 = st.columns(3)
+            with filter_col1:
+                selected_types = st.multiselect("Property Type", list(property_summary.index), key="explore_types")
+            with filter_col2:
+                fraud_filter = st.selectbox("Status", ["All", "Fraudulent", "Legitimate"], key="explore_status")
+            with filter_col3:
+                min_value = st.number_input("Min Property Value (NGN)", min_value=0.0, value=0.0, key="explore_min_value")
+            
+            filters = []
+            if selected_types:
+                filters.append(("property_type", "in", selected_types))
+            if fraud_filter != "All":
+                filters.append(("fraudulent", "==", 1 if fraud_filter == "Fraudulent" else 0))
+            if min_value > 0:
+                filters.append(("property_value", ">=", min_value))
+            
+            sort_col1, sort_col2, sort_col3 = st.columns(3)
+            with sort_col1:
+                sort_by = st.selectbox("Sort By", ["(none)"] + available_columns, key="explore_sort")
+            with sort_col2:
+                descending = st.checkbox("Descending", key="explore_descending")
+            with sort_col3:
+                page_size = st.selectbox("Rows per Page", [25, 50, 100, 250], index=1, key="explore_page_size")
+            
+            # Counts only change with the filters or the stored rows
+            filtered = filtered_summary_memo.get_or_compute(
+                (tuple((name, op, tuple(value) if isinstance(value, list) else value) for name, op, value in filters),
+                 transaction_store.version()),
+                lambda: transaction_store.filtered_summary(filters)
+            )
+            page_count = max(1, -(-filtered["transactions"] // page_size))
+            explore_page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key="explore_page")
+            page_df = transaction_store.query(
+                filters,
+                sort_by=None if sort_by == "(none)" else sort_by,
+                ascending=not descending,
+                offset=(explore_page - 1) * page_size,
+                limit=page_size
+            )
+            filtered_rate = filtered["fraud_cases"] / filtered["transactions"] * 100 if filtered["transactions"] else 0.0
+            st.caption(
+                f"{filtered['transactions']} matching transactions, {filtered['fraud_cases']} fraud cases "
+                f"({filtered_rate:.2f}%) - page {explore_page} of {page_count}"
+            )
+            st.dataframe(page_df)
+            
         except FileNotFoundError:
             st.error("Transaction log file not found")
     
@@ -250,18 +290,71 @@ if st.session_state.is_admin:
         st.write("Current Model: Real Estate Fraud Detection Model")
         st.write("Last Updated: ", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
         
+        st.subheader("Document Verification Queue")
+        verification_metrics = verification_pool.metrics()
+        queue_col1, queue_col2, queue_col3 = st.columns(3)
+        with queue_col1:
+            st.metric("Queue Depth", verification_metrics["queue_depth"])
+        with queue_col2:
+            st.metric("Running", f"{verification_metrics['running']}/{verification_metrics['max_workers']}")
+        with queue_col3:
+            st.metric("Completed", verification_metrics["completed"])
+        
+        st.subheader("History Rescoring")
+        st.write("Re-apply the current fraud metric thresholds to every saved check, using all CPU cores.")
+        rescoring_job = get_rescoring_job()
+        if st.button("Rescore Check History"):
+            if not rescoring_job.start():
+                st.warning("A rescoring run is already in progress")
+        rescoring_progress = rescoring_job.progress()
+        if rescoring_progress["state"] == "running":
+            total = rescoring_progress["total"]
+            st.progress(
+                rescoring_progress["done"] / total if total else 0.0,
+                text=f"{rescoring_progress['phase'].capitalize()}: {rescoring_progress['done']} of {total}"
+            )
+            if st.button("Refresh rescoring progress"):
+                st.rerun()
+        elif rescoring_progress["state"] == "failed":
+            st.error(f"❌ Rescoring failed: {rescoring_progress['error']}")
+        rescoring_versions = list_versions()
+        if rescoring_versions:
+            latest = rescoring_versions[0]
+            st.caption(
+                f"Latest result set v{latest['version']} ({latest['created'][:19]}): "
+                f"{latest['records']} records in {latest['seconds']}s, "
+                f"{latest['risk_level_changes']} risk levels changed"
+            )
+        
         st.subheader("System Health")
         try:
-            df = pd.read_csv("transactions_log.csv")
-            st.success("✅ Transaction log is accessible")
-            st.success("✅ Model is loaded successfully")
-            st.success("✅ Encoders are loaded successfully")
+            ingest_transactions()
         except Exception as e:
             st.error(f"❌ System Error: {str(e)}")
+        
+        # Rolling per-stage latency (last samples of each stage in this process)
+        stage_summary = timings.summary()
+        if stage_summary:
+            st.dataframe(pd.DataFrame([
+                {
+                    "Stage": stage,
+                    "Samples": stats["count"],
+                    "p50 (ms)": round(stats["p50"], 2),
+                    "p95 (ms)": round(stats["p95"], 2),
+                    "p99 (ms)": round(stats["p99"], 2)
+                }
+                for stage, stats in stage_summary.items()
+            ]).set_index("Stage"))
+        else:
+            st.info("No timing samples recorded yet")
+        st.caption(f"Exported in Prometheus text format to {timings.export_path}")
+        
+        st.subheader("Result Caches")
+        st.dataframe(pd.DataFrame.from_dict(memo_stats(), orient="index"))
     
     with admin_tab4:
         st.header("Fraud Detection Metrics")
-        metrics = load_fraud_metrics()
+        metrics = load_rule_plan().metrics
         
         for metric_id, metric in metrics["metrics"].items():
             with st.expander(f"{metric['name']} ({metric['risk_level'].upper()})"):
@@ -277,6 +370,82 @@ if st.session_state.is_admin:
                     st.write("**High Risk Areas:**")
                     for area in metric["high_risk_areas"]:
                         st.write(f"- {area}")
+        
+        # Live distribution of each check's inputs, from the drift sketches (no history scan)
+        st.subheader("Threshold Drift")
+        drift_rule_plan = load_rule_plan()
+        drift_col1, drift_col2 = st.columns(2)
+        with drift_col1:
+            drift_type = st.selectbox("Property Type", ["All"] + drift_monitor.property_types(), key="drift_type")
+        with drift_col2:
+            drift_month = st.selectbox("Month", ["All"] + drift_monitor.months()[::-1], key="drift_month")
+        drift_rows = []
+        drift_selection = (None if drift_type == "All" else drift_type, None if drift_month == "All" else drift_month)
+        for check_id in MONITORED_CHECKS:
+            rule = drift_rule_plan[check_id]
+            sketch = drift_monitor.sketch(check_id, *drift_selection)
+            if sketch.n == 0:
+                continue
+            p10, p50, p90, p99 = sketch.quantiles([0.1, 0.5, 0.9, 0.99])
+            # Counted from each check's saved verdict, so exemptions are included
+            pass_rate = drift_monitor.pass_rate(check_id, *drift_selection)
+            drift_rows.append({
+                "Check": rule.metric["name"],
+                "Samples": sketch.n,
+                "p10": round(p10, 2),
+                "p50": round(p50, 2),
+                "p90": round(p90, 2),
+                "p99": round(p99, 2),
+                "Threshold": rule.threshold,
+                "Pass Rate (%)": None if pass_rate is None else round(pass_rate * 100, 1)
+            })
+        if drift_rows:
+            st.dataframe(pd.DataFrame(drift_rows).set_index("Check"))
+            st.caption("Quantiles are estimates from bounded-memory KLL sketches (about 1% rank error).")
+        else:
+            st.info("No check values recorded for this selection yet")
+        
+        # What-if tuning: each slider move is a binary search over presorted history values
+        st.subheader("What-If Threshold Tuning")
+        rule_plan = load_rule_plan()
+        what_if = get_what_if(rule_plan, CHECKS_HISTORY_DIR, refresh=st.button("Reload check history"))
+        if what_if.size == 0:
+            st.info("No check history to tune against yet")
+        else:
+            current_bands = what_if.current_bands()
+            st.caption(
+                f"{what_if.size} historical checks. Current bands: "
+                + ", ".join(f"{band} {count}" for band, count in current_bands.items())
+            )
+            candidate_thresholds = {}
+            for check_id in what_if.checks:
+                rule = rule_plan[check_id]
+                low, high = what_if.value_range(check_id)
+                low, high = min(low, rule.threshold), max(high, rule.threshold)
+                candidate = st.slider(
+                    f"{rule.metric['name']} ({rule.metric['unit']})",
+                    min_value=float(low),
+                    max_value=float(high) if high > low else float(low) + 1.0,
+                    value=float(rule.threshold),
+                    key=f"what_if_{check_id}"
+                )
+                candidate_thresholds[check_id] = candidate
+                impact = what_if.impact(check_id, candidate)
+                impact_cols = st.columns(len(impact["bands"]) + 1)
+                with impact_cols[0]:
+                    st.metric("Verdicts Flipped", impact["flips"])
+                for col, (band, count) in zip(impact_cols[1:], impact["bands"].items()):
+                    with col:
+                        st.metric(f"{band} Risk", count, delta=count - current_bands[band], delta_color="off")
+            
+            changed = {c: t for c, t in candidate_thresholds.items() if t != rule_plan[c].threshold}
+            if len(changed) > 1:
+                st.write("**All changed thresholds together:**")
+                combined_bands = what_if.combined_bands(changed)
+                combined_cols = st.columns(len(combined_bands))
+                for col, (band, count) in zip(combined_cols, combined_bands.items()):
+                    with col:
+                        st.metric(f"{band} Risk", count, delta=count - current_bands[band], delta_color="off")
 
 # Main Application
 else:
@@ -285,8 +454,79 @@ else:
     # Tabs: Form | Insights
     tab1, tab2 = st.tabs(["🔍 Fraud Check", "📊 Insights Dashboard"])
     
+    # Load model and encoders (once per process, shared across sessions)
+    with timings.span("model_load"):
+        from model_service import get_model_service
+        model_service = get_model_service()
+    
     with tab1:
         st.header("Fraud Detection System")
+        
+        # Batch mode: the same checks for every row of an uploaded file, saved in one write
+        with st.expander("📂 Batch Check (CSV / Parquet upload)"):
+            st.write(
+                "Upload transactions in the transactions_log.csv column layout. Rows need buyer_name, "
+                "seller_name, ssn, property_value, mortgage_amount and property/buyer coordinates; "
+                "property_size, transaction_days and property_type are used when present."
+            )
+            batch_file = st.file_uploader("Transactions file", type=["csv", "parquet"], key="batch_upload")
+            batch_chunk_rows = st.selectbox("Rows per chunk", [250, 1000, 5000], index=1, key="batch_chunk_rows")
+            if batch_file is not None and st.button("Run Batch Check"):
+                from batch_check import BatchCheck, iter_upload_chunks
+                batch = BatchCheck(
+                    load_rule_plan(), buyer_index, identity_index,
+                    zone_index=risk_zones.maybe_reload(), model_service=model_service, source=batch_file.name
+                )
+                batch_progress = st.progress(0.0, text="Reading upload...")
+                batch_table = st.empty()
+                batch_results = []
+                batch_size = getattr(batch_file, "size", 0)
+                try:
+                    for chunk in iter_upload_chunks(batch_file, batch_chunk_rows):
+                        with timings.span("batch_chunk"):
+                            batch_results.append(batch.check_chunk(chunk))
+                        # Partial results stream in as each chunk finishes
+                        position = batch_file.tell() if hasattr(batch_file, "tell") else 0
+                        batch_progress.progress(
+                            min(position / batch_size, 1.0) if batch_size else 0.0,
+                            text=f"Checked {batch.rows_read} rows ({batch.rows_skipped} skipped)"
+                        )
+                        batch_table.dataframe(pd.concat(batch_results[-5:], ignore_index=True).tail(200))
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+                else:
+                    save_check_histories(batch.records)
+                    batch_progress.progress(1.0, text=f"Checked {batch.rows_read} rows ({batch.rows_skipped} skipped)")
+                    batch_df = pd.concat(batch_results, ignore_index=True) if batch_results else pd.DataFrame()
+                    # Kept in the session so the download survives the rerun it triggers
+                    st.session_state.batch_check = {
+                        "name": batch_file.name,
+                        "rows": batch.rows_read,
+                        "skipped": batch.rows_skipped,
+                        "bands": batch.band_counts,
+                        "missing_checks": batch.missing_checks or [],
+                        "csv": batch_df.to_csv(index=False).encode("utf-8"),
+                    }
+                    batch_table.dataframe(batch_df.head(200))
+            
+            batch_summary = st.session_state.get("batch_check")
+            if batch_summary is not None:
+                st.write(f"**Results for {batch_summary['name']}:** {batch_summary['rows']} rows, "
+                         f"{batch_summary['skipped']} skipped")
+                band_cols = st.columns(3)
+                for col, band in zip(band_cols, ["High", "Medium", "Low"]):
+                    with col:
+                        st.metric(f"{band} Risk", batch_summary["bands"].get(band, 0))
+                if batch_summary["missing_checks"]:
+                    st.caption("Not evaluated (no input columns in the file): " + ", ".join(
+                        batch_summary["missing_checks"]))
+                st.download_button(
+                    "Download Results (CSV)",
+                    batch_summary["csv"],
+                    file_name=batch_summary["name"].rsplit(".", 1)[0] + "_checked.csv",
+                    mime="text/csv"
+                )
+        
         st.write("Enter the Real Estate Transaction Details")
 
         buyer_name = st.text_input("Buyer Name")
@@ -307,8 +547,8 @@ else:
 
         # Document upload section
         st.subheader("Required Documents")
-        metrics = load_fraud_metrics()
-        required_docs = metrics["metrics"]["document_verification_check"]["required_documents"]
+        rule_plan = load_rule_plan()
+        required_docs = rule_plan.required_documents
         
         # Document selection
         st.write("Select documents to upload:")
@@ -320,6 +560,7 @@ else:
         )
         
         # Document upload interface
+        current_transaction_key = transaction_key(buyer_name, seller_name, location_lat, location_long)
         uploaded_files = {}
         document_status = {}
         
@@ -339,52 +580,76 @@ else:
                     )
                     
                     if uploaded_file is not None:
-                        # Generate unique transaction ID
-                        transaction_id = f"{buyer_name}_{seller_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                        # Save and verify document (no-op on reruns with the same upload)
+                        with timings.span("document_store"):
+                            document_record = document_store.put(uploaded_file)
+                            verification_result = document_store.verify(document_record)
                         
-                        # Save and verify document
-                        file_path = save_uploaded_file(uploaded_file, transaction_id, doc)
-                        verification_result = verify_document(file_path)
+                        # Deep verification runs in the background; reruns only poll its status
+                        job = verification_pool.status(
+                            verification_pool.submit(document_record),
+                            current_transaction_key
+                        )
+                        verification_result = dict(verification_result, deep_verification=job["state"], fingerprints=[])
+                        if job["result"] is not None:
+                            verification_result["is_valid"] = verification_result["is_valid"] and job["result"]["is_valid"]
+                            verification_result["issues"] = verification_result["issues"] + job["result"]["issues"]
+                            verification_result["fingerprints"] = job["result"]["fingerprints"]
                         
-                        uploaded_files[doc] = file_path
+                        uploaded_files[doc] = verification_result["file_path"]
                         document_status[doc] = verification_result
                         
-                        if verification_result["is_valid"]:
-                            st.success("✅ Document uploaded and verified successfully")
-                        else:
+                        if not verification_result["is_valid"]:
                             st.error("❌ Document verification failed:")
                             for issue in verification_result["issues"]:
                                 st.write(f"- {issue}")
+                        elif job["result"] is None:
+                            st.info("⏳ Document uploaded; deep verification in progress")
+                        else:
+                            st.success("✅ Document uploaded and verified successfully")
         
+        # Documents whose deep verification has not finished are not verified yet
+        pending_docs = [doc for doc, s in document_status.items() if s["deep_verification"] in ("queued", "running")]
+
         # Show upload status
         if uploaded_files:
             st.write("---")
             st.subheader("Upload Status")
             for doc, status in document_status.items():
-                if status["is_valid"]:
-                    st.success(f"✅ {doc}: Uploaded and verified")
-                else:
+                if not status["is_valid"]:
                     st.error(f"❌ {doc}: Failed verification")
                     for issue in status["issues"]:
                         st.write(f"- {issue}")
+                elif status["deep_verification"] in ("queued", "running"):
+                    st.info(f"⏳ {doc}: Uploaded, deep verification {status['deep_verification']}")
+                else:
+                    st.success(f"✅ {doc}: Uploaded and verified")
+            if pending_docs:
+                st.caption(f"Verification queue depth: {verification_pool.queue_depth}")
+                st.button("Refresh verification status")
 
-        distance = None
-        if all(-90 <= lat <= 90 for lat in [location_lat, buyer_lat]) and \
-           all(-180 <= lon <= 180 for lon in [location_long, buyer_long]):
-            distance = haversine(location_lat, location_long, buyer_lat, buyer_long)
-        else:
+        coordinates_valid = all(-90 <= lat <= 90 for lat in [location_lat, buyer_lat]) and \
+            all(-180 <= lon <= 180 for lon in [location_long, buyer_long])
+        if not coordinates_valid:
             st.warning("Invalid latitude or longitude values.")
 
         if st.button("Check for Fraud"):
-            if buyer_name and seller_name and ssn and distance is not None:
-                # Load fraud metrics
-                metrics = load_fraud_metrics()
-                
+            # Only pay for the distance when a check is actually requested
+            distance = None
+            if coordinates_valid:
+                distance = haversine(location_lat, location_long, buyer_lat, buyer_long)
+            if pending_docs:
+                st.warning(f"Deep verification is still running for: {', '.join(pending_docs)}. "
+                           "Refresh the verification status and check again once it finishes.")
+            elif buyer_name and seller_name and ssn and distance is not None:
                 # Perform checks
                 checks = {
                     "timestamp": datetime.now().isoformat(),
                     "buyer_name": buyer_name,
                     "seller_name": seller_name,
+                    "ssn_last4": normalize_ssn(ssn),
+                    "buyer_lat": buyer_lat,
+                    "buyer_long": buyer_long,
                     "property_type": property_type,
                     "checks": {},
                     "documents": {}
@@ -398,7 +663,9 @@ else:
                         checks["documents"][doc] = {
                             "is_valid": status["is_valid"],
                             "issues": status["issues"],
-                            "file_path": status["file_path"]
+                            "file_path": status["file_path"],
+                            "sha256": status["sha256"],
+                            "deep_verification": status["deep_verification"]
                         }
                         if not status["is_valid"]:
                             all_docs_valid = False
@@ -410,73 +677,87 @@ else:
                         }
                         all_docs_valid = False
                 
-                # Distance check
-                checks["checks"]["distance"] = {
-                    "value": distance,
-                    "threshold": metrics["metrics"]["distance_check"]["threshold"],
-                    "passed": distance <= metrics["metrics"]["distance_check"]["threshold"]
-                }
+                # Buyer's previous transactions, an indexed lookup rather than a history scan
+                with timings.span("buyer_lookup"):
+                    buyer_history = buyer_index.lookup(buyer_name, ssn)
                 
-                # Property value check
-                checks["checks"]["property_value"] = {
-                    "value": property_value,
-                    "threshold": metrics["metrics"]["property_value_check"]["threshold"],
-                    "passed": property_value <= metrics["metrics"]["property_value_check"]["threshold"]
-                }
+                # Earlier transactions sharing this SSN fragment, name, address or seller
+                with timings.span("identity_lookup"):
+                    identity_collisions = identity_index.lookup(buyer_name, ssn, seller_name, buyer_lat, buyer_long)
+                checks["identity_collisions"] = identity_collisions
                 
-                # Mortgage ratio check
-                mortgage_ratio = mortgage_amount / property_value if property_value > 0 else 0
-                checks["checks"]["mortgage_ratio"] = {
-                    "value": mortgage_ratio,
-                    "threshold": metrics["metrics"]["mortgage_ratio_check"]["threshold"],
-                    "passed": mortgage_ratio <= metrics["metrics"]["mortgage_ratio_check"]["threshold"]
-                }
-                
-                # Transaction timing check
-                checks["checks"]["transaction_timing"] = {
-                    "value": transaction_days,
-                    "threshold": metrics["metrics"]["transaction_timing_check"]["threshold"],
-                    "passed": transaction_days >= metrics["metrics"]["transaction_timing_check"]["threshold"]
-                }
-                
-                # Price per sqm check
-                price_per_sqm = property_value / property_size if property_size > 0 else 0
-                checks["checks"]["price_per_sqm"] = {
-                    "value": price_per_sqm,
-                    "threshold": metrics["metrics"]["price_per_sqm_check"]["threshold"],
-                    "passed": price_per_sqm <= metrics["metrics"]["price_per_sqm_check"]["threshold"]
-                }
+                # Rule checks, scored by the same engine as the batch rescoring job
+                with timings.span("rule_scoring"):
+                    rule_inputs = {
+                        "distance": distance,
+                        "location_lat": location_lat,
+                        "location_long": location_long,
+                        "property_value": property_value,
+                        "mortgage_amount": mortgage_amount,
+                        "property_size": property_size,
+                        "transaction_days": transaction_days,
+                        "documents_valid": all_docs_valid,
+                        "buyer_transaction_count": buyer_history["transaction_count"],
+                        "identity_collisions": identity_collisions["collisions"]
+                    }
+                    zone_index, zones_mtime = risk_zones.snapshot()
+                    # Same inputs under the same rules and zone file give the same verdicts
+                    rule_checks, risk_score, risk_level = check_memo.get_or_compute(
+                        (tuple(rule_inputs.items()), rule_plan.mtime, zones_mtime),
+                        lambda: score_transaction(rule_inputs, rule_plan, risk_zones=zone_index)
+                    )
+                checks["checks"].update({name: dict(check) for name, check in rule_checks.items()})
                 
-                # Document verification check
-                checks["checks"]["document_verification"] = {
-                    "value": all_docs_valid,
-                    "passed": all_docs_valid
-                }
+                # ML fraud probability from the trained model, shown next to the rule score
+                with timings.span("ml_predict"):
+                    model_features = {
+                        "property_type": property_type,
+                        "property_value": property_value,
+                        "mortgage_amount": mortgage_amount,
+                        "property_size": property_size,
+                        "location_lat": location_lat,
+                        "location_long": location_long,
+                        "buyer_lat": buyer_lat,
+                        "buyer_long": buyer_long,
+                        "distance": distance,
+                        "transaction_days": transaction_days,
+                        "transaction_month": datetime.now().month,
+                        "buyer_gender": buyer_gender
+                    }
+                    ml_probability = prediction_memo.get_or_compute(
+                        (tuple(model_features.items()), model_service.fingerprint),
+                        lambda: float(model_service.predict_proba([model_features])[0])
+                    )
+                checks["risk_score"] = risk_score
+                checks["ml_probability"] = ml_probability
                 
                 # Save checks to history
                 save_check_history(checks)
                 
-                # Calculate risk score
-                risk_score = 0
-                for check in checks["checks"].values():
-                    if not check["passed"]:
-                        metric_id = next(k for k, v in metrics["metrics"].items() 
-                                      if v["threshold"] == check.get("threshold"))
-                        risk_score += metrics["risk_levels"][metrics["metrics"][metric_id]["risk_level"]]["weight"]
+                # Remember document fingerprints so reuse on other transactions is caught
+                for doc, status in document_status.items():
+                    if status["fingerprints"]:
+                        verification_pool.fingerprints.record(status["fingerprints"], current_transaction_key, doc)
                 
                 # Display results
                 st.subheader("Fraud Detection Results")
                 
-                if risk_score >= 5:
+                if risk_level == "High":
                     st.error("🚨 High Risk Transaction")
-                elif risk_score >= 3:
+                elif risk_level == "Medium":
                     st.warning("⚠️ Medium Risk Transaction")
                 else:
                     st.success("✅ Low Risk Transaction")
                 
+                score_col1, score_col2 = st.columns(2)
+                with score_col1:
+                    st.metric("Rule Risk Score", risk_score)
+                with score_col2:
+                    st.metric("ML Fraud Probability", f"{ml_probability:.1%}")
+                
                 st.subheader("Detailed Check Results")
                 for check_name, check_result in checks["checks"].items():
-                    metric = next(m for m in metrics["metrics"].values() if m["name"].lower().replace(" ", "_") == check_name)
+                    metric = rule_plan[check_name].metric
                     if not check_result["passed"]:
                         st.error(f"❌ {metric['name']}")
                         st.write(f"Reason: {metric['description']}")
@@ -499,31 +780,31 @@ else:
 
     with tab2:
         st.header("📊 Real Estate Fraud Insights Dashboard")
+        with timings.span("import_charting"):
+            import io
+            import matplotlib.pyplot as plt
 
-        try:
-            df = pd.read_csv("transactions_log.csv")
-
-            df["fraudulent"] = df["fraudulent"].astype(int)
-            fraud_counts = df.groupby("property_type")["fraudulent"].sum()
-            total_counts = df["property_type"].value_counts()
-            fraud_rates = (fraud_counts / total_counts) * 100
+        def render_pie_chart(summary_df):
+            fig1, ax1 = plt.subplots()
+            ax1.pie(summary_df["Fraud Cases"], labels=summary_df.index, autopct="%1.1f%%", startangle=90)
+            ax1.axis("equal")
+            image = io.BytesIO()
+            fig1.savefig(image, format="png", bbox_inches="tight")
+            plt.close(fig1)
+            return image.getvalue()
 
-            summary_df = pd.DataFrame({
-                "Fraud Cases": fraud_counts,
-                "Total Transactions": total_counts,
-                "Fraud Rate (%)": fraud_rates.round(2)
-            }).fillna(0)
+        try:
+            ingest_transactions()
+            data_version = transaction_store.version()
+            summary_df = transaction_store.property_type_summary()
 
             # Bar Chart
             st.subheader("Fraud Cases by Property Type")
             st.bar_chart(summary_df["Fraud Cases"])
 
-            # Pie Chart
+            # Pie Chart, rendered once per version of the stored data
             st.subheader("Fraud Distribution Pie Chart")
-            fig1, ax1 = plt.subplots()
-            ax1.pie(summary_df["Fraud Cases"], labels=summary_df.index, autopct="%1.1f%%", startangle=90)
-            ax1.axis("equal")
-            st.pyplot(fig1)
+            st.image(chart_memo.get_or_compute(("fraud_pie", data_version), lambda: render_pie_chart(summary_df)))
 
             # Line Chart
             st.subheader("Fraud Rate (%) by Property Type")
@@ -531,13 +812,15 @@ else:
 
             # Table
             st.subheader("Fraud Summary Table")
-            st.dataframe(summary_df.style.highlight_max(axis=0, color="lightgreen"))
+            st.dataframe(chart_memo.get_or_compute(
+                ("summary_table", data_version),
+                lambda: summary_df.style.highlight_max(axis=0, color="lightgreen")
+            ))
 
             # Monthly Trend Area Chart
             st.subheader("Monthly Fraud Trends")
-            if "month" in df.columns:
-                df["month"] = df["month"].astype(int)
-                month_fraud = df[df["fraudulent"] == 1]["month"].value_counts().sort_index()
+            if transaction_store.has_month_data():
+                month_fraud = transaction_store.monthly_fraud_counts()
                 months = pd.date_range("2024-01-01", periods=12, freq='ME').strftime('%b')
                 monthly_df = pd.DataFrame({
                     "Month": months,
@@ -0,0 +1,188 @@
+"""Batch mode of the Fraud Check form: score an uploaded transaction file chunk by chunk.
+
+The upload uses the transactions_log.csv column layout (the form's own field names
+are accepted too). Every row goes through the same rule checks, buyer history and
+identity lookups, risk banding and ML model as a single check. Rows are looked up
+as if each earlier row of the upload had already been saved, so the verdicts match
+submitting the rows one at a time. History records are collected rather than
+written, so the caller can save the whole upload in one bulk write.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from buyer_index import normalize_ssn
+from fraud_engine import COLUMN_ALIASES, score_columns
+from geo import distance_km
+
+DEFAULT_CHUNK_ROWS = 1000
+
+# A row without these cannot be checked; the form refuses to submit without them
+REQUIRED_COLUMNS = ["buyer_name", "seller_name", "ssn", "property_value", "mortgage_amount",
+                    "location_lat", "location_long", "buyer_lat", "buyer_long"]
+
+# Optional inputs; a check whose input column is missing from the file is not evaluated
+OPTIONAL_COLUMNS = ["transaction_id", "property_type", "property_size", "transaction_days",
+                    "buyer_gender", "transaction_month", "documents_valid"]
+
+# Optional numeric inputs that, when the file has the column, every row must fill
+# with at least the form's minimum; a blank would silently pass price_per_sqm or
+# reach the history and drift sketches as NaN
+OPTIONAL_MINIMUMS = {"property_size": 1.0, "transaction_days": 1.0}
+
+
+def iter_upload_chunks(uploaded_file, chunksize=DEFAULT_CHUNK_ROWS):
+    """Yield DataFrames of at most `chunksize` rows from an uploaded CSV or Parquet file"""
+    if uploaded_file.name.lower().endswith((".parquet", ".pq")):
+        for batch in pq.ParquetFile(uploaded_file).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(uploaded_file, chunksize=chunksize, dtype={"ssn": str})
+
+
+def _normalize_columns(chunk):
+    chunk = chunk.rename(columns={alias: name for alias, name in COLUMN_ALIASES.items()
+                                  if alias in chunk.columns and name not in chunk.columns})
+    missing = [name for name in REQUIRED_COLUMNS if name not in chunk.columns]
+    if missing:
+        raise ValueError(f"Uploaded file is missing required columns: {', '.join(missing)}")
+    return chunk
+
+
+def _valid_rows(chunk):
+    """Mask of rows with every required field present, coordinates in range and OPTIONAL_MINIMUMS met"""
+    valid = np.ones(len(chunk), dtype=bool)
+    for name in ["buyer_name", "seller_name", "ssn"]:
+        valid &= chunk[name].fillna("").astype(str).str.strip().ne("").to_numpy()
+    for name in ["property_value", "mortgage_amount"]:
+        valid &= pd.to_numeric(chunk[name], errors="coerce").notna().to_numpy()
+    for name, limit in [("location_lat", 90), ("buyer_lat", 90), ("location_long", 180), ("buyer_long", 180)]:
+        values = pd.to_numeric(chunk[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        valid &= np.abs(values) <= limit
+    for name, minimum in OPTIONAL_MINIMUMS.items():
+        if name in chunk.columns:
+            valid &= pd.to_numeric(chunk[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan) >= minimum
+    return valid
+
+
+class BatchCheck:
+    """Scores the chunks of one upload, keeping the state that spans chunks"""
+
+    def __init__(self, plan, buyer_index, identity_index, zone_index=None, model_service=None,
+                 source=None):
+        self.plan = plan
+        self.buyer_index = buyer_index
+        self.identity_index = identity_index
+        self.zone_index = zone_index
+        self.model_service = model_service
+        self.source = source
+        self.records = []           # history records of the checked rows, saved by the caller
+        self.rows_read = 0
+        self.rows_skipped = 0
+        self.band_counts = {}
+        self.missing_checks = None  # checks the file has no input columns for
+        # Rows looked up but not saved yet, so later rows see them
+        self._buyer_pending = {}
+        self._identity_pending = {}
+
+    def check_chunk(self, chunk):
+        """Score one chunk and return its per-row results (skipped rows included)"""
+        chunk = _normalize_columns(chunk).reset_index(drop=True)
+        row_numbers = np.arange(self.rows_read, self.rows_read + len(chunk)) + 1
+        self.rows_read += len(chunk)
+        valid = _valid_rows(chunk)
+        self.rows_skipped += int((~valid).sum())
+        rows = chunk[valid].reset_index(drop=True)
+        timestamp = datetime.now().isoformat()
+
+        numeric = {name: pd.to_numeric(rows[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                   for name in ["property_value", "mortgage_amount", "property_size", "transaction_days",
+                                "location_lat", "location_long", "buyer_lat", "buyer_long"]
+                   if name in rows.columns}
+        ssns = [normalize_ssn(ssn) for ssn in rows["ssn"]]
+        columns = dict(numeric)
+        columns["distance"] = distance_km(
+            numeric["location_lat"], numeric["location_long"], numeric["buyer_lat"], numeric["buyer_long"],
+            mode="auto", threshold=self.plan["distance"].threshold
+        )
+        # No documents come with an upload, so as on the form they count as not verified
+        if "documents_valid" in rows.columns:
+            columns["documents_valid"] = rows["documents_valid"].fillna(False).to_numpy(dtype=bool)
+        else:
+            columns["documents_valid"] = np.zeros(len(rows), dtype=bool)
+        if "transaction_days" in numeric:
+            fast_closing = ~self.plan.passed("transaction_timing", numeric["transaction_days"])
+        else:
+            fast_closing = np.zeros(len(rows), dtype=bool)
+
+        columns["buyer_transaction_count"] = np.array(self.buyer_index.lookup_many(
+            zip(rows["buyer_name"], ssns), self._buyer_pending
+        ), dtype=np.float64)
+        identity_collisions = self.identity_index.lookup_many(
+            zip(rows["buyer_name"], ssns, rows["seller_name"], numeric["buyer_lat"], numeric["buyer_long"],
+                fast_closing),
+            self._identity_pending
+        )
+        columns["identity_collisions"] = np.array([c["collisions"] for c in identity_collisions], dtype=np.float64)
+
+        scored = score_columns(columns, self.plan, risk_zones=self.zone_index)
+        check_ids = [rule.check_id for rule in self.plan.rules.values() if f"{rule.check_id}_passed" in scored]
+        if self.missing_checks is None:
+            self.missing_checks = [check_id for check_id in self.plan.rules if check_id not in check_ids]
+
+        ml_probability = None
+        if self.model_service is not None and len(rows):
+            features = rows.assign(distance=columns["distance"], **numeric)
+            if "transaction_month" not in features.columns:
+                features["transaction_month"] = datetime.now().month
+            ml_probability = self.model_service.predict_proba(features)
+
+        property_types = rows["property_type"] if "property_type" in rows.columns else pd.Series([None] * len(rows))
+        for i in range(len(rows)):
+            checks = {}
+            for check_id in check_ids:
+                rule = self.plan[check_id]
+                value = scored[f"{check_id}_value"][i]
+                check = {"value": value.item() if hasattr(value, "item") else value}
+                if rule.threshold is not None:
+                    check["threshold"] = rule.threshold
+                check["passed"] = bool(scored[f"{check_id}_passed"][i])
+                checks[check_id] = check
+            record = {
+                "timestamp": timestamp,
+                "buyer_name": rows["buyer_name"].iat[i],
+                "seller_name": rows["seller_name"].iat[i],
+                "ssn_last4": ssns[i],
+                "buyer_lat": float(numeric["buyer_lat"][i]),
+                "buyer_long": float(numeric["buyer_long"][i]),
+                "property_type": None if pd.isna(property_types.iat[i]) else property_types.iat[i],
+                "checks": checks,
+                "documents": {} if "documents_valid" in rows.columns else {
+                    doc: {"is_valid": False, "issues": ["Document not uploaded"], "file_path": None}
+                    for doc in self.plan.required_documents
+                },
+                "identity_collisions": identity_collisions[i],
+                "risk_score": int(scored["risk_score"][i]),
+                "ml_probability": None if ml_probability is None else float(ml_probability[i]),
+                "batch_source": self.source,
+            }
+            self.records.append(record)
+            band = str(scored["risk_level"][i])
+            self.band_counts[band] = self.band_counts.get(band, 0) + 1
+
+        # Per-row results, with skipped rows kept in place so the file lines up with the upload
+        results = pd.DataFrame({"row": row_numbers})
+        for name in ["transaction_id", "buyer_name", "seller_name", "property_type"]:
+            if name in chunk.columns:
+                results[name] = chunk[name]
+        results["status"] = np.where(valid, "checked", "skipped: missing or invalid fields")
+        checked = pd.DataFrame({"risk_level": scored["risk_level"], "risk_score": scored["risk_score"]})
+        if ml_probability is not None:
+            checked["ml_probability"] = ml_probability
+        for check_id in check_ids:
+            checked[f"{check_id}_value"] = scored[f"{check_id}_value"]
+            checked[f"{check_id}_passed"] = scored[f"{check_id}_passed"]
+        checked.index = np.flatnonzero(valid)
+        return results.join(checked)
@@ -0,0 +1,244 @@
+"""Benchmarks for the hot paths behind app.py.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --sizes 1000 100000 --baseline bench.json
+
+Every case runs against fixed, seeded synthetic datasets from
+generate_transactions_vectorized, so numbers are comparable between runs. Results
+are written as JSON; with --baseline each case is compared to the saved run and the
+exit status is 1 if any case got slower than the tolerance allows.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from buyer_index import BuyerIndex
+from check_history import CheckHistoryLog, save_checks
+from drift_monitor import DriftMonitor
+from fraud_engine import score_transaction, score_transactions
+from generate_transactions import generate_transactions_vectorized
+from geo import geodesic_km, haversine_km
+from identity_index import IdentityIndex
+from rule_plan import get_rule_plan
+from transaction_store import TransactionStore
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+ALL_SIZES = DEFAULT_SIZES + [10_000_000]
+BENCHMARK_SEED = 20240101
+
+# geodesic is pure Python; larger inputs would only measure the same per-call cost longer
+GEODESIC_MAX_ROWS = 10_000
+
+SAMPLE_TRANSACTION = {
+    "location_lat": 6.5244, "location_long": 3.3792,
+    "buyer_lat": 6.6018, "buyer_long": 3.3515,
+    "property_value": 45_000_000.0, "mortgage_amount": 30_000_000.0,
+    "property_size": 120.0, "transaction_days": 45, "documents_valid": True,
+}
+
+_datasets = {}
+
+
+def dataset(size):
+    if size not in _datasets:
+        _datasets[size] = generate_transactions_vectorized(size, seed=BENCHMARK_SEED)
+    return _datasets[size]
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """Median seconds per call; fast calls are looped until each sample takes min_time"""
+    func()
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - start >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops)
+    return statistics.median(samples)
+
+
+def bench_single_check(results, sizes):
+    plan = get_rule_plan()
+    seconds = measure(lambda: score_transaction(SAMPLE_TRANSACTION, plan))
+    results["single_check_latency"] = {"rows": 1, "seconds": seconds}
+
+
+def bench_batch_scoring(results, sizes):
+    plan = get_rule_plan()
+    for size in sizes:
+        df = dataset(size)
+        seconds = measure(lambda: score_transactions(df, plan), repeat=3, min_time=0)
+        results[f"batch_scoring[{size}]"] = {"rows": size, "seconds": seconds, "rows_per_sec": size / seconds}
+
+
+def bench_distance(results, sizes):
+    for size in sizes:
+        df = dataset(size)
+        coords = [df[c].to_numpy() for c in ("latitude", "longitude", "buyer_latitude", "buyer_longitude")]
+        seconds = measure(lambda: haversine_km(*coords), repeat=3, min_time=0)
+        results[f"haversine[{size}]"] = {"rows": size, "seconds": seconds, "rows_per_sec": size / seconds}
+        if size <= GEODESIC_MAX_ROWS:
+            seconds = measure(lambda: geodesic_km(*coords), repeat=3, min_time=0)
+            results[f"geodesic[{size}]"] = {"rows": size, "seconds": seconds, "rows_per_sec": size / seconds}
+
+
+def bench_history(results, sizes, workdir):
+    checks = score_transaction(SAMPLE_TRANSACTION)[0]
+
+    def record(i):
+        return {
+            "timestamp": datetime(2024, 1 + i % 12, 1).isoformat(), "buyer_name": f"Buyer {i}",
+            "seller_name": f"Seller {i % 1000}", "ssn_last4": f"{i % 10_000:04d}",
+            "buyer_lat": 6.0 + (i % 1000) / 1000, "buyer_long": 3.0 + (i // 1000 % 1000) / 1000,
+            "property_type": "Residential", "checks": checks, "documents": {},
+        }
+
+    for size in sizes:
+        directory = os.path.join(workdir, f"history-{size}")
+        log = CheckHistoryLog(directory)
+        buyer_index = BuyerIndex(os.path.join(workdir, f"buyers-{size}.sqlite"))
+        identity_index = IdentityIndex(os.path.join(workdir, f"identities-{size}.sqlite"))
+        drift_monitor = DriftMonitor(os.path.join(workdir, f"drift-{size}.json"))
+        for start in range(0, size, 10_000):
+            save_checks([record(i) for i in range(start, min(start + 10_000, size))],
+                        log, buyer_index, identity_index, drift_monitor)
+        log.flush()
+        drift_monitor.save()
+        counter = iter(range(size, size + 100_000_000))
+        # Everything one Check for Fraud save writes, once the stores already hold `size` records
+        seconds = measure(lambda: save_checks([record(next(counter))], log, buyer_index, identity_index,
+                                              drift_monitor), repeat=3, min_time=0.05)
+        results[f"save_check_history[{size}]"] = {"rows": size, "seconds": seconds}
+        # The log append alone
+        seconds = measure(lambda: log.append(record(0)), repeat=3, min_time=0.05)
+        results[f"history_append[{size}]"] = {"rows": size, "seconds": seconds}
+        seconds = measure(lambda: log.tail(10), repeat=3, min_time=0.05)
+        results[f"history_tail[{size}]"] = {"rows": size, "seconds": seconds}
+        log.flush()
+        drift_monitor.save()
+        shutil.rmtree(directory)
+
+
+def bench_dashboard(results, sizes, workdir):
+    for size in sizes:
+        csv_path = os.path.join(workdir, f"transactions-{size}.csv")
+        dataset(size).to_csv(csv_path, index=False)
+        store_dir = os.path.join(workdir, f"store-{size}")
+
+        def ingest():
+            shutil.rmtree(store_dir, ignore_errors=True)
+            TransactionStore(store_dir).ingest_csv(csv_path)
+
+        seconds = measure(ingest, repeat=1, min_time=0)
+        results[f"dashboard_ingest[{size}]"] = {"rows": size, "seconds": seconds, "rows_per_sec": size / seconds}
+
+        # What every Insights Dashboard rerun pays: a freshness check plus the aggregates
+        store = TransactionStore(store_dir)
+        store.ingest_csv(csv_path)
+
+        def rerun():
+            store.ingest_csv(csv_path)
+            store.property_type_summary()
+            store.monthly_fraud_counts()
+
+        seconds = measure(rerun, repeat=3, min_time=0.05)
+        results[f"dashboard_rerun[{size}]"] = {"rows": size, "seconds": seconds}
+        os.remove(csv_path)
+        shutil.rmtree(store_dir)
+
+
+BENCHMARKS = {
+    "single_check": bench_single_check,
+    "batch_scoring": bench_batch_scoring,
+    "distance": bench_distance,
+    "history": bench_history,
+    "dashboard": bench_dashboard,
+}
+
+
+def compare(results, baseline, tolerance):
+    """Per-case ratio against the baseline; returns the names of regressed cases"""
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:40s} {result['seconds'] * 1000:12.3f} ms   (new)")
+            continue
+        ratio = result["seconds"] / base["seconds"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        result["baseline_seconds"] = base["seconds"]
+        result["ratio"] = ratio
+        print(f"{name:40s} {result['seconds'] * 1000:12.3f} ms   x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fraud scoring hot paths")
+    parser.add_argument("--sizes", type=int, nargs="*", default=DEFAULT_SIZES,
+                        help=f"Dataset sizes (up to {ALL_SIZES[-1]:,})")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="Saved results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed slowdown against the baseline before a case counts as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="fraud-bench-")
+    try:
+        for name in args.only:
+            print(f"Running {name}...", file=sys.stderr)
+            benchmark = BENCHMARKS[name]
+            if name in ("history", "dashboard"):
+                benchmark(results, args.sizes, workdir)
+            else:
+                benchmark(results, args.sizes)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    else:
+        for name, result in sorted(results.items()):
+            print(f"{name:40s} {result['seconds'] * 1000:12.3f} ms")
+
+    report = {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "sizes": args.sizes,
+        "results": results,
+        "regressions": regressions,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {args.output}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Persistent buyer index backing the buyer_history_check.
+
+    python buyer_index.py --rebuild     # rebuild from the check history log
+
+Each buyer is keyed by a normalized identity (name plus SSN last 4), and stores
+transaction count, cumulative property value and first/last-seen times. Saving a
+check updates one row; evaluating the check reads one row by primary key, so both
+stay constant-time however many buyers the index holds.
+"""
+import argparse
+import re
+import sqlite3
+import threading
+import unicodedata
+from datetime import datetime
+
+from check_history import CHECKS_HISTORY_DIR, CheckHistoryLog
+
+BUYER_INDEX_FILE = "buyer_index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buyers (
+    identity TEXT PRIMARY KEY,
+    transaction_count INTEGER NOT NULL,
+    total_value REAL NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+) WITHOUT ROWID
+"""
+
+
+def normalize_name(name):
+    """Case-, accent-, punctuation- and whitespace-insensitive form of a person's name"""
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(c for c in name if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9 ]+", " ", name).split())
+
+
+def normalize_ssn(ssn):
+    digits = re.sub(r"\D", "", str(ssn or ""))
+    return digits[-4:]
+
+
+def buyer_identity(buyer_name, ssn):
+    return f"{normalize_name(buyer_name)}|{normalize_ssn(ssn)}"
+
+
+class BuyerIndex:
+    def __init__(self, path=BUYER_INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+
+    def lookup(self, buyer_name, ssn):
+        """Buyer's history so far, or zeros for a buyer never seen before"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT transaction_count, total_value, first_seen, last_seen FROM buyers WHERE identity = ?",
+                (buyer_identity(buyer_name, ssn),),
+            ).fetchone()
+        if row is None:
+            return {"transaction_count": 0, "total_value": 0.0, "first_seen": None, "last_seen": None}
+        return dict(zip(("transaction_count", "total_value", "first_seen", "last_seen"), row))
+
+    def lookup_many(self, rows, pending=None, sequential=True):
+        """Transaction counts for (buyer_name, ssn) rows, as if each row were recorded before the next.
+
+        `pending` maps identity -> count of rows looked up but not yet recorded; pass the
+        same dict to successive calls so a batch split into chunks counts its earlier
+        chunks too. With `sequential=False` every row is looked up against the index
+        alone, as `lookup` would.
+        """
+        pending = {} if pending is None or not sequential else pending
+        identities = [buyer_identity(name, ssn) for name, ssn in rows]
+        unique = list(set(identities))
+        stored = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                stored.update(self._conn.execute(
+                    f"SELECT identity, transaction_count FROM buyers WHERE identity IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall())
+        counts = []
+        for identity in identities:
+            counts.append(stored.get(identity, 0) + pending.get(identity, 0))
+            if sequential:
+                pending[identity] = pending.get(identity, 0) + 1
+        return counts
+
+    def record(self, buyer_name, ssn, property_value, seen_at=None):
+        self.record_many([(buyer_name, ssn, property_value, seen_at)])
+
+    def record_many(self, rows):
+        """Fold (buyer_name, ssn, property_value, seen_at) rows into the index in one transaction"""
+        now = datetime.now().isoformat()
+        params = [
+            (buyer_identity(name, ssn), float(value or 0), seen_at or now, seen_at or now)
+            for name, ssn, value, seen_at in rows
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    """
+                    INSERT INTO buyers (identity, transaction_count, total_value, first_seen, last_seen)
+                    VALUES (?, 1, ?, ?, ?)
+                    ON CONFLICT(identity) DO UPDATE SET
+                        transaction_count = transaction_count + 1,
+                        total_value = total_value + excluded.total_value,
+                        first_seen = MIN(first_seen, excluded.first_seen),
+                        last_seen = MAX(last_seen, excluded.last_seen)
+                    """,
+                    params,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM buyers").fetchone()[0]
+
+    def rebuild_from_history(self, history_log, batch_size=10_000):
+        """Recreate the index from every record in a CheckHistoryLog"""
+        with self._lock:
+            self._conn.execute("DELETE FROM buyers")
+        batch = []
+        for record in history_log.iter_records():
+            property_value = record.get("checks", {}).get("property_value", {}).get("value")
+            batch.append((record.get("buyer_name"), record.get("ssn_last4"), property_value, record.get("timestamp")))
+            if len(batch) >= batch_size:
+                self.record_many(batch)
+                batch = []
+        if batch:
+            self.record_many(batch)
+        return len(self)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_buyer_index(path=BUYER_INDEX_FILE):
+    """Process-wide index instance, shared across Streamlit sessions and reruns"""
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = BuyerIndex(path)
+        return _indexes[path]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the buyer history index")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from the check history")
+    parser.add_argument("--index", default=BUYER_INDEX_FILE)
+    parser.add_argument("--history", default=CHECKS_HISTORY_DIR)
+    args = parser.parse_args()
+    index = BuyerIndex(args.index)
+    if args.rebuild:
+        print(f"Indexed {index.rebuild_from_history(CheckHistoryLog(args.history))} buyers")
+    else:
+        print(f"{len(index)} buyers indexed in {args.index}")
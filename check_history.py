@@ -0,0 +1,243 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from locks import file_lock
+
+CHECKS_HISTORY_DIR = "fraud_checks_history"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+LOCK_FILE = ".lock"
+
+
+class CheckHistoryLog:
+    """Append-only, line-delimited fraud check history split into size-rotated segments.
+
+    Each record is one JSON line. Appends take a cross-process lock so concurrent
+    writers never interleave or lose records, and fsync is batched: the data is
+    synced every `fsync_every` records or `fsync_interval` seconds, whichever
+    comes first, and on `flush()` / interpreter exit.
+    """
+
+    def __init__(self, directory=CHECKS_HISTORY_DIR, max_segment_bytes=64 * 1024 * 1024,
+                 fsync_every=32, fsync_interval=1.0):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._dirty_segment = None
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.flush)
+
+    # Segments
+
+    def segments(self):
+        """Segment file paths, oldest first"""
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}")
+
+    def _active_segment(self, incoming_bytes):
+        segments = self.segments()
+        if not segments:
+            return self._segment_path(1)
+        current = segments[-1]
+        size = os.path.getsize(current)
+        if size > 0 and size + incoming_bytes > self.max_segment_bytes:
+            number = int(os.path.basename(current)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            return self._segment_path(number + 1)
+        return current
+
+    # Writing
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        payload = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        if not payload:
+            return
+        with self._lock, file_lock(os.path.join(self.directory, LOCK_FILE)):
+            segment = self._active_segment(len(payload))
+            if self._dirty_segment not in (None, segment):
+                self._sync(self._dirty_segment)
+            fd = os.open(segment, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # Terminate a torn line left by a crashed writer, so it can't swallow our first record
+                size = os.fstat(fd).st_size
+                if size and os.pread(fd, 1, size - 1) != b"\n":
+                    payload = b"\n" + payload
+                os.write(fd, payload)
+            finally:
+                os.close(fd)
+            self._dirty_segment = segment
+            self._unsynced += len(records)
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync(segment)
+
+    def _sync(self, segment):
+        fd = os.open(segment, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._dirty_segment = None
+
+    def flush(self):
+        """Force any batched writes to disk"""
+        with self._lock:
+            if self._dirty_segment is not None and os.path.exists(self._dirty_segment):
+                self._sync(self._dirty_segment)
+
+    # Reading
+
+    def __iter__(self):
+        return self.iter_records()
+
+    def iter_records(self):
+        """Stream every record, oldest first, one line at a time"""
+        for segment in self.segments():
+            with open(segment, "r", encoding="utf-8") as f:
+                for line in f:
+                    # A torn final line from a crashed writer is skipped, not fatal
+                    if line.endswith("\n"):
+                        yield json.loads(line)
+
+    def tail(self, n=10, block_size=64 * 1024):
+        """Return the last `n` records without reading the whole log"""
+        records = deque()
+
+        def take(line):
+            # Torn lines (a write in progress, or a crashed writer) are skipped and
+            # earlier lines read instead, so up to `n` whole records are returned
+            if line and len(records) < n:
+                try:
+                    records.appendleft(json.loads(line))
+                except json.JSONDecodeError:
+                    pass
+
+        for segment in reversed(self.segments()):
+            with open(segment, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                position = f.tell()
+                remainder = b""
+                last_block = True
+                while position > 0 and len(records) < n:
+                    step = min(block_size, position)
+                    position -= step
+                    f.seek(position)
+                    chunk = f.read(step) + remainder
+                    parts = chunk.split(b"\n")
+                    if last_block:
+                        # Bytes after the final newline are a line still being written
+                        parts.pop()
+                        last_block = False
+                    remainder = parts.pop(0) if parts else b""
+                    for part in reversed(parts):
+                        take(part)
+                if position == 0:
+                    take(remainder)
+            if len(records) >= n:
+                break
+        return list(records)
+
+    def follow(self, poll_interval=1.0):
+        """Yield records as they are appended, like `tail -f`"""
+        segment, offset = None, 0
+        segments = self.segments()
+        if segments:
+            segment, offset = segments[-1], os.path.getsize(segments[-1])
+        while True:
+            segments = self.segments()
+            if segments and segment is None:
+                segment, offset = segments[0], 0
+            if segment is not None:
+                with open(segment, "rb") as f:
+                    f.seek(offset)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        offset += len(line)
+                        yield json.loads(line)
+                later = [s for s in segments if s > segment]
+                if later:
+                    segment, offset = later[0], 0
+                    continue
+            time.sleep(poll_interval)
+
+
+def migrate_json_history(json_path, log):
+    """One-time import of the legacy JSON array history file into the log.
+
+    The legacy file is renamed to `<name>.migrating` before the import and to
+    `<name>.migrated` after it, so later calls are a single existence check. Imported
+    records carry a `migrated_from` tag: if a crash interrupted an import, the next
+    call skips the records that already reached the log instead of duplicating them.
+    """
+    migrating_path = json_path + ".migrating"
+    if not os.path.exists(json_path) and not os.path.exists(migrating_path):
+        return 0
+    with file_lock(os.path.join(log.directory, LOCK_FILE) + ".migrate"):
+        resuming = os.path.exists(migrating_path)
+        if not resuming:
+            # Another process may have finished the migration while we waited
+            if not os.path.exists(json_path):
+                return 0
+            os.replace(json_path, migrating_path)
+        with open(migrating_path, "r") as f:
+            history = json.load(f)
+        source = os.path.basename(json_path)
+        imported = 0
+        if resuming:
+            imported = sum(1 for record in log.iter_records() if record.get("migrated_from") == source)
+        log.append_many([dict(record, migrated_from=source) for record in history[imported:]])
+        log.flush()
+        os.replace(migrating_path, json_path + ".migrated")
+    return len(history) - imported
+
+
+def save_checks(records, log, buyer_index, identity_index, drift_monitor):
+    """Save check records to the log and fold them into every index derived from it.
+
+    This is the whole save path of the app (one check or a batch upload), in one
+    bulk write per store.
+    """
+    log.append_many(records)
+    buyer_index.record_many([
+        (record["buyer_name"], record.get("ssn_last4"), record["checks"]["property_value"]["value"],
+         record["timestamp"])
+        for record in records
+    ])
+    identity_index.record_many([
+        (record["buyer_name"], record.get("ssn_last4"), record["seller_name"],
+         record.get("buyer_lat"), record.get("buyer_long"),
+         record["checks"].get("transaction_timing", {}).get("passed") is False, record["timestamp"])
+        for record in records
+    ])
+    drift_monitor.record_many(records)
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_history_log(directory=CHECKS_HISTORY_DIR):
+    """Process-wide log instance, shared across Streamlit sessions and reruns"""
+    with _logs_lock:
+        if directory not in _logs:
+            _logs[directory] = CheckHistoryLog(directory)
+        return _logs[directory]
@@ -0,0 +1,141 @@
+"""Content-addressed store for uploaded transaction documents.
+
+Documents are stored once under their SHA-256 digest
+(document_uploads/objects/ab/abcdef....pdf), so the same file uploaded for many
+transactions, or re-submitted on every Streamlit rerun, is written to disk once.
+Digests and verification results are cached in process, so an unchanged upload is
+neither re-hashed, re-written nor re-verified on later reruns.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from memo import LRUCache
+
+UPLOADS_DIR = "document_uploads"
+CHUNK_SIZE = 1024 * 1024
+
+# Max file size accepted by verification (10MB)
+MAX_DOCUMENT_BYTES = 10 * 1024 * 1024
+ALLOWED_EXTENSIONS = ['.pdf', '.jpg', '.jpeg', '.png']
+
+# Bound on remembered uploads and verification results
+CACHE_SIZE = 1024
+
+
+def verify_document(file_path):
+    """Basic document verification (can be enhanced with actual document verification logic)"""
+    if file_path and os.path.exists(file_path):
+        # Get file size
+        file_size = os.path.getsize(file_path)
+
+        # Basic checks
+        is_valid = True
+        issues = []
+
+        # Check file size (max 10MB)
+        if file_size > MAX_DOCUMENT_BYTES:
+            is_valid = False
+            issues.append("File size exceeds 10MB limit")
+
+        # Check file extension
+        if not any(file_path.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
+            is_valid = False
+            issues.append("Invalid file format. Allowed formats: PDF, JPG, JPEG, PNG")
+
+        return {
+            "is_valid": is_valid,
+            "issues": issues,
+            "file_size": file_size,
+            "file_path": file_path
+        }
+    return {
+        "is_valid": False,
+        "issues": ["No file uploaded"],
+        "file_size": 0,
+        "file_path": None
+    }
+
+
+def _upload_key(uploaded_file):
+    """Identity of an upload across reruns: Streamlit's file_id, else name and size"""
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id:
+        return file_id
+    return (uploaded_file.name, getattr(uploaded_file, "size", None))
+
+
+class DocumentStore:
+    def __init__(self, root=UPLOADS_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._uploads = LRUCache(CACHE_SIZE)
+        self._verifications = LRUCache(CACHE_SIZE)
+
+    def object_path(self, digest, extension):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}{extension.lower()}")
+
+    def put(self, uploaded_file):
+        """Store an upload (any object with name/seek/read) and return its record.
+
+        The record holds the content digest, stored path and size. Returns the cached
+        record without touching the file again if this upload was seen before.
+        """
+        key = _upload_key(uploaded_file)
+        record = self._uploads.get(key)
+        if record is not None and os.path.exists(record["file_path"]):
+            return record
+
+        digest = hashlib.sha256()
+        size = 0
+        uploaded_file.seek(0)
+        for chunk in iter(lambda: uploaded_file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+        digest = digest.hexdigest()
+
+        path = self.object_path(digest, Path(uploaded_file.name).suffix)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    uploaded_file.seek(0)
+                    for chunk in iter(lambda: uploaded_file.read(CHUNK_SIZE), b""):
+                        f.write(chunk)
+                # Identical content racing in from another session lands on the same name
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        uploaded_file.seek(0)
+
+        record = {"sha256": digest, "file_path": path, "file_size": size, "original_name": uploaded_file.name}
+        self._uploads.put(key, record)
+        return record
+
+    def verify(self, record):
+        """Verification result for a stored document, computed once per stored object"""
+        cache_key = record["file_path"]
+        result = self._verifications.get(cache_key)
+        if result is None:
+            result = verify_document(record["file_path"])
+            result["sha256"] = record["sha256"]
+            self._verifications.put(cache_key, result)
+        return result
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_document_store(root=UPLOADS_DIR):
+    """Process-wide store, so upload and verification caches outlive reruns"""
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = DocumentStore(root)
+        return _stores[root]
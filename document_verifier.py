@@ -0,0 +1,394 @@
+"""Deep document verification on a bounded background worker pool.
+
+Jobs check that a stored document's magic bytes match its extension, parse enough
+of the PDF / JPEG / PNG structure to catch truncated or corrupt files, and
+fingerprint what is specific to the document: the whole file, each PDF page's
+content stream and each page-sized image. Shared template parts (fonts, ICC
+profiles, letterhead logos) are not fingerprinted, so honest documents from the same
+template do not match. Images get a 64-bit difference hash, matched within a small
+Hamming distance, so a re-encoded or rescaled copy still matches. Fingerprints are
+kept in a SQLite index, so the same Certificate of Occupancy (or any other
+document) turning up on an unrelated transaction is flagged without rescanning
+earlier uploads.
+"""
+import hashlib
+import io
+import re
+import sqlite3
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    from PIL import Image
+except ImportError:  # Images are then fingerprinted by their raw bytes only
+    Image = None
+
+from buyer_index import normalize_name
+
+FINGERPRINT_INDEX_FILE = "document_fingerprints.sqlite"
+
+MAGIC_BYTES = {
+    ".pdf": [b"%PDF-"],
+    ".jpg": [b"\xff\xd8\xff"],
+    ".jpeg": [b"\xff\xd8\xff"],
+    ".png": [b"\x89PNG\r\n\x1a\n"],
+}
+
+PDF_STREAM = re.compile(rb"stream\r?\n(.*?)\r?\nendstream", re.S)
+PDF_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+PDF_OBJECT = re.compile(rb"(\d+)\s+(\d+)\s+obj\b(.*?)\bendobj", re.S)
+PDF_CONTENTS = re.compile(rb"/Contents\s*(\[[^\]]*\]|\d+\s+\d+\s+R)")
+PDF_REFERENCE = re.compile(rb"(\d+)\s+(\d+)\s+R")
+PDF_IMAGE = re.compile(rb"/Subtype\s*/Image(?![a-zA-Z])")
+PDF_WIDTH = re.compile(rb"/Width\s+(\d+)")
+PDF_HEIGHT = re.compile(rb"/Height\s+(\d+)")
+
+# Images smaller than this (logos, stamps, signatures on a template) are not fingerprinted
+MIN_IMAGE_PIXELS = 300 * 300
+
+# Difference hashes this many bits apart or fewer are the same picture. The hash is
+# split into MAX_HASH_DISTANCE + 1 bands, so any match shares at least one band exactly
+MAX_HASH_DISTANCE = 4
+HASH_BANDS = [(0, 13), (13, 13), (26, 13), (39, 13), (52, 12)]
+
+# Nearly uniform images (blank pages) hash to noise and would match each other
+FLAT_IMAGE_RANGE = 16
+
+# Completed job results kept for polling
+MAX_FINISHED_JOBS = 4096
+
+
+def transaction_key(buyer_name, seller_name, location_lat, location_long):
+    """Identity of the transaction a document was submitted for"""
+    return f"{normalize_name(buyer_name)}|{normalize_name(seller_name)}|{location_lat:.4f},{location_long:.4f}"
+
+
+def difference_hash(pixels):
+    """64-bit difference hash of a 9x8 grayscale thumbnail (row-major pixel list).
+
+    Returns None for a nearly uniform image.
+    """
+    if max(pixels) - min(pixels) < FLAT_IMAGE_RANGE:
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def _image_hash(data):
+    """"dhash:<hex>" fingerprint of an encoded image, or None if it is blank"""
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width * image.height < MIN_IMAGE_PIXELS:
+            return None
+        pixels = list(image.convert("L").resize((9, 8)).getdata())
+    bits = difference_hash(pixels)
+    return None if bits is None else f"dhash:{bits:016x}"
+
+
+def hash_bands(bits):
+    return [(bits >> start) & ((1 << width) - 1) for start, width in HASH_BANDS]
+
+
+def _pdf_fingerprints(data):
+    """Fingerprints of the page content streams and page-sized image XObjects of a PDF"""
+    objects = {}
+    for number, generation, body in PDF_OBJECT.findall(data):
+        objects[(int(number), int(generation))] = body
+    content_refs = set()
+    for body in objects.values():
+        if PDF_PAGE.search(body):
+            for contents in PDF_CONTENTS.findall(body):
+                content_refs.update((int(n), int(g)) for n, g in PDF_REFERENCE.findall(contents))
+
+    fingerprints = []
+    for ref, body in objects.items():
+        stream = PDF_STREAM.search(body)
+        if stream is None:
+            continue
+        dictionary, stream = body[:stream.start()], stream.group(1)
+        if ref in content_refs:
+            fingerprints.append("pdfcontent:" + hashlib.sha256(stream).hexdigest())
+        elif PDF_IMAGE.search(dictionary):
+            width, height = PDF_WIDTH.search(dictionary), PDF_HEIGHT.search(dictionary)
+            if width is None or height is None or int(width.group(1)) * int(height.group(1)) < MIN_IMAGE_PIXELS:
+                continue
+            fingerprint = None
+            # JPEG-encoded scans can be decoded for a perceptual hash
+            if b"/DCTDecode" in dictionary and Image is not None:
+                try:
+                    fingerprint = _image_hash(stream)
+                except Exception:
+                    fingerprint = None
+            fingerprints.append(fingerprint or "pdfimage:" + hashlib.sha256(stream).hexdigest())
+    return fingerprints
+
+
+def inspect_pdf(data, issues):
+    if b"%%EOF" not in data[-1024:]:
+        issues.append("PDF is truncated (no %%EOF marker)")
+    if b"startxref" not in data[-2048:]:
+        issues.append("PDF has no cross-reference table")
+    if b"/Encrypt" in data:
+        issues.append("PDF is encrypted and cannot be inspected")
+    pages = len(PDF_PAGE.findall(data))
+    if pages == 0:
+        issues.append("PDF contains no pages")
+    return {"pages": pages}, _pdf_fingerprints(data)
+
+
+def inspect_png(data, issues):
+    position, chunks, info = 8, set(), {}
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        crc = data[position + 8 + length:position + 12 + length]
+        if len(body) < length or len(crc) < 4:
+            issues.append("PNG is truncated")
+            break
+        if zlib.crc32(chunk_type + body) != struct.unpack(">I", crc)[0]:
+            issues.append(f"PNG chunk {chunk_type.decode('latin-1')} is corrupt")
+            break
+        if chunk_type == b"IHDR":
+            info["width"], info["height"] = struct.unpack(">II", body[:8])
+        chunks.add(chunk_type)
+        position += 12 + length
+        if chunk_type == b"IEND":
+            break
+    if b"IHDR" not in chunks or b"IEND" not in chunks:
+        issues.append("PNG is missing required chunks")
+    return info, []
+
+
+def inspect_jpeg(data, issues):
+    info = {}
+    if not data.rstrip(b"\x00").endswith(b"\xff\xd9"):
+        issues.append("JPEG is truncated (no end-of-image marker)")
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            issues.append("JPEG marker structure is corrupt")
+            break
+        marker = data[position + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            position += 2
+            continue
+        length = struct.unpack(">H", data[position + 2:position + 4])[0]
+        # Start-of-frame markers carry the image dimensions
+        if marker in (0xC0, 0xC1, 0xC2) and position + 9 <= len(data):
+            info["height"], info["width"] = struct.unpack(">HH", data[position + 5:position + 9])
+        if marker == 0xDA:  # start of scan: entropy-coded data follows
+            break
+        position += 2 + length
+    if "width" not in info:
+        issues.append("JPEG has no frame header")
+    return info, []
+
+
+INSPECTORS = {".pdf": inspect_pdf, ".png": inspect_png, ".jpg": inspect_jpeg, ".jpeg": inspect_jpeg}
+
+
+def deep_verify(file_path):
+    """Full verification of one stored document; runs on a worker thread"""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    extension = "." + file_path.rsplit(".", 1)[-1].lower() if "." in file_path else ""
+    issues = []
+
+    signatures = MAGIC_BYTES.get(extension)
+    if signatures is None:
+        issues.append(f"Unsupported file type {extension or '(none)'}")
+        return {"is_valid": False, "issues": issues, "fingerprints": [], "details": {}}
+    if not any(data.startswith(signature) for signature in signatures):
+        issues.append(f"File content does not match its {extension} extension")
+        return {"is_valid": False, "issues": issues, "fingerprints": [], "details": {}}
+
+    details, fingerprints = INSPECTORS[extension](data, issues)
+    fingerprints.insert(0, "sha256:" + hashlib.sha256(data).hexdigest())
+    if extension != ".pdf" and Image is not None:
+        try:
+            image_hash = _image_hash(data)
+        except Exception:
+            issues.append("Image could not be decoded")
+        else:
+            if image_hash is not None:
+                fingerprints.append(image_hash)
+    return {"is_valid": not issues, "issues": issues, "fingerprints": fingerprints, "details": details}
+
+
+class FingerprintIndex:
+    """SQLite index of document fingerprint -> transactions it was submitted with.
+
+    Exact fingerprints (hashes of bytes) are matched by equality. Difference hashes
+    are also stored split into bands; candidates sharing a band are then checked
+    against MAX_HASH_DISTANCE.
+    """
+
+    def __init__(self, path=FINGERPRINT_INDEX_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                fingerprint TEXT NOT NULL,
+                transaction_key TEXT NOT NULL,
+                document_type TEXT,
+                first_seen TEXT NOT NULL,
+                PRIMARY KEY (fingerprint, transaction_key)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_hash_bands (
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL,
+                PRIMARY KEY (band, value, fingerprint)
+            ) WITHOUT ROWID
+            """
+        )
+
+    def record(self, fingerprints, transaction_key, document_type=None):
+        now = datetime.now().isoformat()
+        bands = [
+            (band, value, fp)
+            for fp in fingerprints if fp.startswith("dhash:")
+            for band, value in enumerate(hash_bands(int(fp[len("dhash:"):], 16)))
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO fingerprints VALUES (?, ?, ?, ?)",
+                    [(fp, transaction_key, document_type, now) for fp in fingerprints],
+                )
+                self._conn.executemany("INSERT OR IGNORE INTO image_hash_bands VALUES (?, ?, ?)", bands)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _near_hashes(self, fingerprint):
+        """Stored difference hashes within MAX_HASH_DISTANCE of `fingerprint`"""
+        bits = int(fingerprint[len("dhash:"):], 16)
+        candidates = set()
+        for band, value in enumerate(hash_bands(bits)):
+            candidates.update(row[0] for row in self._conn.execute(
+                "SELECT fingerprint FROM image_hash_bands WHERE band = ? AND value = ?", (band, value)
+            ))
+        return [fp for fp in candidates
+                if bin(int(fp[len("dhash:"):], 16) ^ bits).count("1") <= MAX_HASH_DISTANCE]
+
+    def other_transactions(self, fingerprints, transaction_key):
+        """Transactions other than `transaction_key` that share any fingerprint"""
+        if not fingerprints:
+            return []
+        with self._lock:
+            matches = set(fingerprints)
+            for fp in fingerprints:
+                if fp.startswith("dhash:"):
+                    matches.update(self._near_hashes(fp))
+            matches = list(matches)
+            keys = set()
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(matches), 500):
+                part = matches[start:start + 500]
+                keys.update(row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT transaction_key FROM fingerprints "
+                    f"WHERE fingerprint IN ({','.join('?' * len(part))}) AND transaction_key != ?",
+                    (*part, transaction_key),
+                ))
+        return sorted(keys)
+
+
+class VerificationPool:
+    """Runs deep_verify jobs on a bounded thread pool, one job per stored document.
+
+    Submitting the same document again returns the existing job, so reruns never
+    queue duplicate work. Callers poll `status()` instead of blocking.
+    """
+
+    def __init__(self, max_workers=2, fingerprint_index=None):
+        self.max_workers = max_workers
+        self.fingerprints = fingerprint_index or FingerprintIndex()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="verify")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._finished_order = []
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def queue_depth(self):
+        return self.queued
+
+    def metrics(self):
+        with self._lock:
+            return {"queue_depth": self.queued, "running": self.running, "completed": self.completed,
+                    "failed": self.failed, "max_workers": self.max_workers}
+
+    def submit(self, record):
+        """Queue deep verification of a DocumentStore record; returns the job id"""
+        job_id = record["file_path"]
+        with self._lock:
+            if job_id in self._jobs:
+                return job_id
+            self._jobs[job_id] = {"state": "queued", "result": None}
+            self.queued += 1
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def _run(self, job_id):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self._jobs[job_id]["state"] = "running"
+        try:
+            result, state = deep_verify(job_id), "done"
+        except Exception as e:
+            result, state = {"is_valid": False, "issues": [f"Verification failed: {e}"], "fingerprints": []}, "failed"
+        with self._lock:
+            self.running -= 1
+            if state == "done":
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._jobs[job_id] = {"state": state, "result": result}
+            self._finished_order.append(job_id)
+            while len(self._finished_order) > MAX_FINISHED_JOBS:
+                self._jobs.pop(self._finished_order.pop(0), None)
+
+    def status(self, job_id, transaction_key=None):
+        """Job state and, once finished, its result including reuse across transactions"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            job = dict(job) if job else {"state": "unknown", "result": None}
+        result = job["result"]
+        if result is not None and transaction_key is not None:
+            reused_in = self.fingerprints.other_transactions(result["fingerprints"], transaction_key)
+            if reused_in:
+                result = dict(result, is_valid=False, reused_in=len(reused_in), issues=result["issues"] + [
+                    f"Same document content was already submitted with {len(reused_in)} other transaction(s)"
+                ])
+            job["result"] = result
+        return job
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_verification_pool(max_workers=2):
+    """Process-wide pool, shared by every Streamlit session"""
+    with _pools_lock:
+        if "pool" not in _pools:
+            _pools["pool"] = VerificationPool(max_workers)
+        return _pools["pool"]
@@ -0,0 +1,320 @@
+"""Streaming drift monitor for the threshold checks' input values.
+
+    python drift_monitor.py --rebuild     # rebuild the sketches from the check history log
+
+Each saved check feeds its values into KLL quantile sketches, one per
+(check, property_type, month), alongside a count of the values whose check
+passed (as the rule engine decided, exemptions included). A KLL sketch keeps
+about 3k weighted samples however many values it has seen. Sketches are
+mergeable, so the "all property types" and "all months" views are merges rather
+than history scans. Property types outside the form's list share one "Other"
+sketch, and only the most recent `max_months` months are kept, which puts a
+fixed bound on total memory.
+
+Sketches are persisted to drift_sketches.json. Updates collect in a per-process
+delta, and a save merges that delta into the file under a cross-process lock, so
+several app processes can feed the same monitor.
+"""
+import argparse
+import atexit
+import json
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from check_history import CHECKS_HISTORY_DIR, CheckHistoryLog
+from locks import file_lock
+from rule_plan import CHECK_DEFINITIONS
+
+DRIFT_SKETCHES_FILE = "drift_sketches.json"
+
+# Checks with a numeric threshold; boolean checks have nothing to drift
+MONITORED_CHECKS = [check_id for check_id, (_, _, comparator) in CHECK_DEFINITIONS.items()
+                    if comparator in ("le", "ge")]
+
+DEFAULT_K = 200
+DEFAULT_MAX_MONTHS = 24
+
+# The Fraud Check form's property types; anything else is bucketed as "Other"
+PROPERTY_TYPES = ["Residential", "Commercial", "Industrial", "Land"]
+
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang and Liberty, 2016).
+
+    Level h holds items of weight 2**h. When a level fills, it is sorted and every
+    other item (from a random offset) is promoted to the next level. Rank error is
+    about 1.7/k with high probability.
+    """
+
+    def __init__(self, k=DEFAULT_K, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [[]]
+        self._random = random.Random(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _size(self):
+        return sum(len(items) for items in self.levels)
+
+    def _max_size(self):
+        return sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def _compress(self):
+        while self._size() >= self._max_size():
+            for level, items in enumerate(self.levels):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.levels):
+                        self.levels.append([])
+                    items.sort()
+                    # An odd item out stays at this level
+                    keep = [items.pop()] if len(items) % 2 else []
+                    self.levels[level + 1].extend(items[self._random.randint(0, 1)::2])
+                    self.levels[level] = keep
+                    break
+
+    def update(self, value):
+        self.levels[0].append(float(value))
+        self.n += 1
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted(self):
+        return sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+
+    def cdf(self, value, inclusive=True):
+        """Estimated fraction of values <= `value` (< `value` if not inclusive)"""
+        total = below = 0
+        for level, items in enumerate(self.levels):
+            weight = 1 << level
+            total += weight * len(items)
+            below += weight * sum(1 for item in items if item < value or (inclusive and item == value))
+        return below / total if total else None
+
+    def quantiles(self, fractions):
+        weighted = self._weighted()
+        if not weighted:
+            return [None] * len(fractions)
+        total = sum(weight for _, weight in weighted)
+        result = []
+        for fraction in fractions:
+            target, cumulative = fraction * total, 0
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    break
+            result.append(value)
+        return result
+
+    def to_dict(self):
+        return {"k": self.k, "n": self.n, "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["k"])
+        sketch.n = data["n"]
+        sketch.levels = [list(items) for items in data["levels"]]
+        return sketch
+
+
+def _property_type(record):
+    property_type = record.get("property_type")
+    if not property_type:
+        return "Unknown"
+    return property_type if property_type in PROPERTY_TYPES else "Other"
+
+
+def _month(timestamp):
+    try:
+        return datetime.fromisoformat(timestamp).strftime("%Y-%m")
+    except (TypeError, ValueError):
+        return datetime.now().strftime("%Y-%m")
+
+
+class DriftMonitor:
+    def __init__(self, path=DRIFT_SKETCHES_FILE, k=DEFAULT_K, max_months=DEFAULT_MAX_MONTHS,
+                 save_every=50, save_interval=10.0):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.k = k
+        self.max_months = max_months
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._sketches, self._passed = self._read()  # "check|property_type|month" -> KLLSketch, pass count
+        self._delta, self._delta_passed = {}, {}      # updates not yet merged into the file
+        self._pending = 0
+        self._last_save = time.monotonic()
+
+    @staticmethod
+    def _key(check_id, property_type, month):
+        return f"{check_id}|{property_type}|{month}"
+
+    def _read(self):
+        """Sketches and pass counts from the file (a count is None in files written before counts were kept)"""
+        if not os.path.exists(self.path):
+            return {}, {}
+        with open(self.path, "r") as f:
+            data = json.load(f)
+        return ({key: KLLSketch.from_dict(item) for key, item in data.items()},
+                {key: item.get("passed") for key, item in data.items()})
+
+    def _prune(self, sketches, passed):
+        """Drop sketches older than the newest `max_months` months"""
+        months = sorted({key.rsplit("|", 1)[1] for key in sketches})
+        expired = set(months[:-self.max_months])
+        for key in [key for key in sketches if key.rsplit("|", 1)[1] in expired]:
+            del sketches[key]
+            passed.pop(key, None)
+
+    def record(self, record):
+        """Feed one saved check record (the history format) into the sketches"""
+        self.record_many([record])
+
+    def record_many(self, records):
+        with self._lock:
+            for record in records:
+                property_type = _property_type(record)
+                month = _month(record.get("timestamp"))
+                for check_id in MONITORED_CHECKS:
+                    check = record.get("checks", {}).get(check_id, {})
+                    if check.get("value") is None:
+                        continue
+                    key = self._key(check_id, property_type, month)
+                    for sketches, passed in ((self._sketches, self._passed), (self._delta, self._delta_passed)):
+                        if key not in sketches:
+                            sketches[key] = KLLSketch(self.k)
+                            passed.setdefault(key, 0)
+                        sketches[key].update(check["value"])
+                        if passed.get(key) is not None:
+                            passed[key] += bool(check.get("passed"))
+                self._pending += 1
+            due = self._pending >= self.save_every or time.monotonic() - self._last_save >= self.save_interval
+        if due:
+            self.save()
+
+    def save(self):
+        """Merge this process's updates into the sketch file"""
+        with self._lock:
+            delta, self._delta, self._pending = self._delta, {}, 0
+            delta_passed, self._delta_passed = self._delta_passed, {}
+            self._last_save = time.monotonic()
+        if not delta:
+            return
+        with file_lock(self.lock_path):
+            sketches, passed = self._read()
+            self._merge(sketches, passed, delta, delta_passed)
+            self._prune(sketches, passed)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({key: dict(sketch.to_dict(), passed=passed.get(key)) for key, sketch in sketches.items()}, f)
+            os.replace(tmp_path, self.path)
+        with self._lock:
+            # Other processes' updates arrive with the file; keep ours not yet saved
+            delta = {key: KLLSketch.from_dict(sketch.to_dict()) for key, sketch in self._delta.items()}
+            self._merge(sketches, passed, delta, self._delta_passed)
+            self._sketches, self._passed = sketches, passed
+
+    @staticmethod
+    def _merge(sketches, passed, delta, delta_passed):
+        """Merge delta sketches and pass counts into `sketches` and `passed` (an unknown count stays unknown)"""
+        for key, sketch in delta.items():
+            if key in sketches:
+                sketches[key] = sketches[key].merge(sketch)
+                known = passed.get(key) is not None and delta_passed.get(key) is not None
+                passed[key] = passed[key] + delta_passed[key] if known else None
+            else:
+                sketches[key] = sketch
+                passed[key] = delta_passed.get(key)
+
+    def property_types(self):
+        with self._lock:
+            return sorted({key.split("|")[1] for key in self._sketches})
+
+    def months(self):
+        with self._lock:
+            return sorted({key.rsplit("|", 1)[1] for key in self._sketches})
+
+    def sketch(self, check_id, property_type=None, month=None):
+        """Merged sketch for a check, optionally restricted to one property type and/or month"""
+        merged = KLLSketch(self.k)
+        with self._lock:
+            for key, sketch in self._sketches.items():
+                key_check, key_type, key_month = key.split("|")
+                if key_check == check_id and property_type in (None, key_type) and month in (None, key_month):
+                    merged.merge(KLLSketch.from_dict(sketch.to_dict()))
+        return merged
+
+    def pass_rate(self, check_id, property_type=None, month=None):
+        """Fraction of a check's values whose check passed, or None if unknown (no values, or
+        sketches written before pass counts were kept; --rebuild fills them in)"""
+        total = passed = 0
+        with self._lock:
+            for key, sketch in self._sketches.items():
+                key_check, key_type, key_month = key.split("|")
+                if key_check == check_id and property_type in (None, key_type) and month in (None, key_month):
+                    if self._passed.get(key) is None:
+                        return None
+                    total += sketch.n
+                    passed += self._passed[key]
+        return passed / total if total else None
+
+    def rebuild_from_history(self, history_log, batch_size=10_000):
+        """Recreate the sketches from every record in a CheckHistoryLog"""
+        with file_lock(self.lock_path):
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        with self._lock:
+            self._sketches, self._delta, self._pending = {}, {}, 0
+            self._passed, self._delta_passed = {}, {}
+        batch = []
+        for record in history_log.iter_records():
+            batch.append(record)
+            if len(batch) >= batch_size:
+                self.record_many(batch)
+                batch = []
+        if batch:
+            self.record_many(batch)
+        self.save()
+        return len(self._sketches)
+
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def get_drift_monitor(path=DRIFT_SKETCHES_FILE):
+    """Process-wide monitor, saved on interpreter exit"""
+    with _monitors_lock:
+        if path not in _monitors:
+            _monitors[path] = DriftMonitor(path)
+            atexit.register(_monitors[path].save)
+        return _monitors[path]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the check value drift sketches")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the sketches from the check history")
+    parser.add_argument("--sketches", default=DRIFT_SKETCHES_FILE)
+    parser.add_argument("--history", default=CHECKS_HISTORY_DIR)
+    args = parser.parse_args()
+    monitor = DriftMonitor(args.sketches)
+    if args.rebuild:
+        print(f"Built {monitor.rebuild_from_history(CheckHistoryLog(args.history))} sketches")
+    else:
+        print(f"{len(monitor.months())} months, {len(monitor.property_types())} property types in {args.sketches}")
@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+
+from geo import distance_km
+from rule_plan import CHECK_DEFINITIONS, RISK_BANDS, as_rule_plan
+
+# transactions_log.csv (generate_transactions.py) names the coordinates differently
+# from the Fraud Check form
+COLUMN_ALIASES = {
+    "latitude": "location_lat",
+    "longitude": "location_long",
+    "buyer_latitude": "buyer_lat",
+    "buyer_longitude": "buyer_long",
+}
+
+
+def check_ids():
+    """All check ids in the order they are evaluated and displayed"""
+    return list(CHECK_DEFINITIONS)
+
+
+def metric_id_for(check_id):
+    return CHECK_DEFINITIONS[check_id][0]
+
+
+def _column(columns, name):
+    values = columns[name]
+    if hasattr(values, "to_numpy"):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.asarray(values, dtype=np.float64)
+
+
+def _bool_column(columns, name):
+    values = columns[name]
+    if hasattr(values, "fillna"):
+        return values.fillna(False).to_numpy(dtype=bool)
+    return np.asarray(values, dtype=bool)
+
+
+def _derive_inputs(columns, plan, distance_mode, risk_zones=None):
+    """Build the raw input array for each rule check that has its columns present.
+
+    Also returns per-check exemption masks: rows where a check passes regardless of
+    its value.
+    """
+    inputs = {}
+    exemptions = {}
+
+    if "distance" in columns:
+        inputs["distance"] = _column(columns, "distance")
+    elif {"location_lat", "location_long", "buyer_lat", "buyer_long"} <= set(columns):
+        inputs["distance"] = distance_km(
+            _column(columns, "location_lat"), _column(columns, "location_long"),
+            _column(columns, "buyer_lat"), _column(columns, "buyer_long"),
+            mode=distance_mode,
+            threshold=plan["distance"].threshold,
+        )
+
+    if "property_value" in columns:
+        property_value = _column(columns, "property_value")
+        inputs["property_value"] = property_value
+
+        # Same zero-guard as the interactive form: a non-positive denominator scores 0
+        if "mortgage_amount" in columns:
+            mortgage_amount = _column(columns, "mortgage_amount")
+            with np.errstate(divide="ignore", invalid="ignore"):
+                inputs["mortgage_ratio"] = np.where(
+                    property_value > 0, mortgage_amount / property_value, 0.0
+                )
+        if "property_size" in columns:
+            property_size = _column(columns, "property_size")
+            with np.errstate(divide="ignore", invalid="ignore"):
+                inputs["price_per_sqm"] = np.where(
+                    property_size > 0, property_value / property_size, 0.0
+                )
+
+    # Ratios already computed upstream (e.g. stored check values) are used as given
+    for name in ("mortgage_ratio", "price_per_sqm"):
+        if name in columns:
+            inputs[name] = _column(columns, name)
+
+    if "transaction_days" in columns:
+        inputs["transaction_days"] = _column(columns, "transaction_days")
+
+    if "documents_valid" in columns:
+        inputs["documents_valid"] = _bool_column(columns, "documents_valid")
+
+    if "buyer_transaction_count" in columns:
+        inputs["buyer_transaction_count"] = _column(columns, "buyer_transaction_count")
+        # Only high-value purchases need an established buyer history
+        if "property_value" in inputs:
+            exemptions["buyer_transaction_count"] = inputs["property_value"] <= plan["property_value"].threshold
+
+    if "in_high_risk_zone" in columns:
+        inputs["in_high_risk_zone"] = _bool_column(columns, "in_high_risk_zone")
+    elif risk_zones is not None and {"location_lat", "location_long"} <= set(columns):
+        inputs["in_high_risk_zone"] = risk_zones.contains(
+            _column(columns, "location_lat"), _column(columns, "location_long")
+        )
+
+    if "identity_collisions" in columns:
+        inputs["identity_collisions"] = _column(columns, "identity_collisions")
+
+    return inputs, exemptions
+
+
+def score_columns(columns, plan=None, distance_mode="auto", risk_zones=None):
+    """Score a mapping of column name -> array; the pandas-free core of score_transactions.
+
+    Returns a dict of result arrays with the same keys as score_transactions' columns.
+    """
+    plan = as_rule_plan(plan)
+    columns = dict(columns)
+    for alias, name in COLUMN_ALIASES.items():
+        if alias in columns and name not in columns:
+            columns[name] = columns.pop(alias)
+
+    inputs, exemptions = _derive_inputs(columns, plan, distance_mode, risk_zones)
+    n_rows = len(next(iter(columns.values()))) if columns else 0
+    result = {}
+    risk_score = np.zeros(n_rows, dtype=np.int64)
+
+    for rule in plan.rules.values():
+        if rule.column not in inputs:
+            continue
+        values = inputs[rule.column]
+        passed = rule.comparator(values, rule.threshold)
+        if rule.column in exemptions:
+            passed = passed | exemptions[rule.column]
+        result[f"{rule.check_id}_value"] = values
+        result[f"{rule.check_id}_passed"] = passed
+        risk_score += np.where(passed, 0, rule.weight)
+
+    result["risk_score"] = risk_score
+    bands = [band for _, band in RISK_BANDS]
+    conditions = [risk_score >= minimum for minimum, _ in RISK_BANDS]
+    result["risk_level"] = np.select(conditions, bands, default=bands[-1])
+    return result
+
+
+def score_transactions(data, plan=None, distance_mode="auto", risk_zones=None):
+    """Score every row of a DataFrame (or Arrow table) against the fraud metric rules.
+
+    `plan` is a compiled RulePlan (or a raw metrics dict); by default the cached plan
+    for fraud_metrics.json is used. Returns a DataFrame with `<check>_value` and
+    `<check>_passed` columns for each check whose inputs are present, plus
+    `risk_score` and `risk_level`. Distances are computed from coordinates with
+    geo.distance_km unless a `distance` column is given; the default "auto" mode
+    gives the same verdicts as the exact geodesic. With a RiskZoneIndex, property
+    coordinates are also checked against the high-risk zones.
+    """
+    if hasattr(data, "to_pandas"):
+        data = data.to_pandas()
+    result = score_columns({name: data[name] for name in data.columns}, plan, distance_mode, risk_zones)
+    return pd.DataFrame(result, index=data.index)
+
+
+def score_transaction(transaction, plan=None, distance_mode="exact", risk_zones=None):
+    """Score a single transaction dict and return its checks in the history format"""
+    plan = as_rule_plan(plan)
+    row = score_transactions(pd.DataFrame([transaction]), plan, distance_mode, risk_zones).iloc[0]
+
+    checks = {}
+    for rule in plan.rules.values():
+        if f"{rule.check_id}_passed" not in row.index:
+            continue
+        value = row[f"{rule.check_id}_value"]
+        check = {"value": value.item() if hasattr(value, "item") else value}
+        if rule.threshold is not None:
+            check["threshold"] = rule.threshold
+        check["passed"] = bool(row[f"{rule.check_id}_passed"])
+        checks[rule.check_id] = check
+
+    return checks, int(row["risk_score"]), row["risk_level"]
@@ -1,9 +1,29 @@
 from faker import Faker
 import pandas as pd
+import numpy as np
 import random
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 fake = Faker()
 
+PROPERTY_TYPES = ["Residential", "Commercial", "Industrial", "Land"]
+PROPERTY_TYPE_WEIGHTS = [0.55, 0.2, 0.1, 0.15]
+
+# Rough bounding box of Nigeria
+LAT_RANGE = (4.3, 13.9)
+LON_RANGE = (2.7, 14.6)
+
+# Fraud patterns the vectorized generator can inject into fraudulent rows; each one
+# pushes the row past the matching fraud_metrics.json check
+FRAUD_PATTERNS = ["distant_buyer", "inflated_value", "high_mortgage_ratio", "rushed_timing", "high_price_per_sqm"]
+
+# Each part draws its buyers and sellers from its own pool of personas, sized so a
+# persona appears in about ROWS_PER_PERSONA rows however large the dataset gets
+NAME_POOL_SIZE = 2000
+ROWS_PER_PERSONA = 2
+
 def generate_fake_transaction():
     return {
         "transaction_id": fake.uuid4(),
@@ -33,6 +53,132 @@ def save_transactions_to_csv(num_records, filename="transactions_log.csv"):
     df = pd.DataFrame(transactions)
     df.to_csv(filename, index=False)
 
+def _persona_pool(seed, part, num_records):
+    """Seeded pool of (name, SSN last 4) personas for one part.
+
+    Names are first, middle and last names combined from Faker's lists (hundreds of
+    millions of combinations), so pools of different parts rarely share a name, and
+    each persona keeps one SSN, so repeat buyers look like the same person.
+    """
+    rng = np.random.default_rng([seed, part, 1])
+    size = max(NAME_POOL_SIZE, num_records // ROWS_PER_PERSONA)
+    person = fake.provider("faker.providers.person")
+    first_names = np.array(list(person.first_names))
+    last_names = np.array(list(person.last_names))
+    names = first_names[rng.integers(0, len(first_names), size)]
+    for pool in (first_names, last_names):
+        names = np.char.add(np.char.add(names, " "), pool[rng.integers(0, len(pool), size)])
+    ssns = np.char.zfill(rng.integers(0, 10_000, size).astype(str), 4)
+    return names.astype(object), ssns
+
+def generate_transactions_vectorized(num_records, seed=0, part=0, fraud_rate=0.03, fraud_patterns=None):
+    """Build a DataFrame of synthetic transactions column by column with NumPy.
+
+    The output depends only on (seed, part), so a sharded run is reproducible no
+    matter how many worker processes generate it. Legitimate rows stay inside the
+    fraud_metrics.json thresholds most of the time; fraudulent rows get one of the
+    configured fraud patterns injected.
+    """
+    fraud_patterns = FRAUD_PATTERNS if fraud_patterns is None else fraud_patterns
+    rng = np.random.default_rng([seed, part])
+    n = num_records
+    names, ssns = _persona_pool(seed, part, n)
+
+    latitude = rng.uniform(*LAT_RANGE, n)
+    longitude = rng.uniform(*LON_RANGE, n)
+    property_size = np.round(rng.lognormal(np.log(120), 0.4, n), 2)
+    # Legitimate prices sit in the 100k-300k NGN/sqm band the metrics describe, so
+    # about 95% of legitimate values stay under the 50M NGN property_value threshold
+    property_value = np.round(property_size * rng.uniform(100_000, 300_000, n), 2)
+    mortgage_amount = np.round(property_value * rng.beta(5, 4, n) * 0.85, 2)
+    transaction_days = np.clip(np.round(rng.normal(60, 12, n)), 31, None).astype(np.int64)
+    # Buyers mostly live within a few tens of km of the property (0.1 deg ~ 11 km)
+    buyer_latitude = latitude + rng.normal(0, 0.1, n)
+    buyer_longitude = longitude + rng.normal(0, 0.1, n)
+
+    fraudulent = rng.random(n) < fraud_rate
+    if fraud_patterns:
+        pattern = rng.integers(0, len(fraud_patterns), n)
+        for i, name in enumerate(fraud_patterns):
+            rows = fraudulent & (pattern == i)
+            k = int(rows.sum())
+            if name == "distant_buyer":
+                buyer_latitude[rows] = rng.uniform(*LAT_RANGE, k)
+                buyer_longitude[rows] = rng.uniform(*LON_RANGE, k)
+            elif name == "inflated_value":
+                property_value[rows] = np.round(property_value[rows] * rng.uniform(3, 10, k), 2)
+            elif name == "high_mortgage_ratio":
+                mortgage_amount[rows] = np.round(property_value[rows] * rng.uniform(0.85, 1.1, k), 2)
+            elif name == "rushed_timing":
+                transaction_days[rows] = rng.integers(1, 30, k)
+            elif name == "high_price_per_sqm":
+                property_size[rows] = np.round(property_value[rows] / rng.uniform(550_000, 1_500_000, k), 2)
+            else:
+                raise ValueError(f"Unknown fraud pattern {name!r}, expected one of {FRAUD_PATTERNS}")
+
+    buyers = rng.integers(0, len(names), n)
+    return pd.DataFrame({
+        "transaction_id": [f"{seed:x}-{part:x}-{i:x}" for i in range(n)],
+        "buyer_name": names[buyers],
+        "seller_name": names[rng.integers(0, len(names), n)],
+        "property_type": np.array(PROPERTY_TYPES)[rng.choice(len(PROPERTY_TYPES), n, p=PROPERTY_TYPE_WEIGHTS)],
+        "property_value": property_value,
+        "mortgage_amount": mortgage_amount,
+        "property_size": property_size,
+        "latitude": latitude,
+        "longitude": longitude,
+        "buyer_latitude": np.clip(buyer_latitude, -90, 90),
+        "buyer_longitude": buyer_longitude,
+        "transaction_month": rng.integers(1, 13, n),
+        "transaction_days": transaction_days,
+        "buyer_gender": np.array(["Male", "Female"])[rng.integers(0, 2, n)],
+        "ssn": ssns[buyers],
+        "fraudulent": fraudulent.astype(np.int64),
+    })
+
+def _write_part(args):
+    output_dir, part, num_records, seed, fraud_rate, fraud_patterns, file_format = args
+    df = generate_transactions_vectorized(num_records, seed, part, fraud_rate, fraud_patterns)
+    path = os.path.join(output_dir, f"part-{part:05d}.{file_format}")
+    if file_format == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+def save_transactions_parallel(num_records, output_dir, seed=0, rows_per_part=1_000_000,
+                               workers=None, fraud_rate=0.03, fraud_patterns=None, file_format="parquet"):
+    """Generate `num_records` rows as part files in `output_dir`, one part per task"""
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = []
+    for part, start in enumerate(range(0, num_records, rows_per_part)):
+        size = min(rows_per_part, num_records - start)
+        tasks.append((output_dir, part, size, seed, fraud_rate, fraud_patterns, file_format))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_write_part, tasks))
+
 if __name__ == "__main__":
-    save_transactions_to_csv(1000)  # Generate 1000 transactions
-    print("Transactions saved to transactions_log.csv")
+    parser = argparse.ArgumentParser(description="Generate synthetic real estate transactions")
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--vectorized", action="store_true",
+                        help="Seeded NumPy generation sharded across processes, written as part files")
+    parser.add_argument("--output", default=None,
+                        help="Output CSV (default transactions_log.csv) or, with --vectorized, output directory")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rows-per-part", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--fraud-rate", type=float, default=0.03)
+    parser.add_argument("--patterns", nargs="*", default=FRAUD_PATTERNS, choices=FRAUD_PATTERNS,
+                        help="Fraud patterns to inject into fraudulent rows")
+    args = parser.parse_args()
+
+    if args.vectorized:
+        output_dir = args.output or "transactions_parts"
+        paths = save_transactions_parallel(args.records, output_dir, args.seed, args.rows_per_part,
+                                           args.workers, args.fraud_rate, args.patterns, args.format)
+        print(f"{args.records} transactions saved to {len(paths)} part files in {output_dir}")
+    else:
+        filename = args.output or "transactions_log.csv"
+        save_transactions_to_csv(args.records, filename)  # Generate 1000 transactions by default
+        print(f"Transactions saved to {filename}")
@@ -0,0 +1,265 @@
+"""Inverted index over checked identities, backing the identity_collision_check.
+
+    python identity_index.py --rebuild     # rebuild from the check history log
+
+Every saved check adds postings for three keys:
+
+    buyer   buyer name          -> SSN last 4s it was used with
+    coords  buyer address cell  -> buyer identities (name and SSN last 4) at that address
+    seller  seller name         -> fast-closing deals (transaction_timing_check failed)
+
+An SSN last 4 has only 10,000 values, so on its own it is shared by many honest
+buyers. It counts as a collision only together with the address: other names that
+used the same last 4 at the same address cell.
+
+Distinct-value counts per key are maintained as postings arrive, so a lookup is a
+handful of primary-key reads whatever the history size, and nothing rescans the
+history log or the transaction CSV.
+"""
+import argparse
+import sqlite3
+import threading
+from datetime import datetime
+
+from buyer_index import buyer_identity, normalize_name, normalize_ssn
+from check_history import CHECKS_HISTORY_DIR, CheckHistoryLog
+
+IDENTITY_INDEX_FILE = "identity_index.sqlite"
+
+# Buyer coordinates are bucketed to 3 decimal places (about 110 m)
+COORDINATE_DECIMALS = 3
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS postings (
+        field TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (field, key, value)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS keys (
+        field TEXT NOT NULL,
+        key TEXT NOT NULL,
+        distinct_values INTEGER NOT NULL DEFAULT 0,
+        fast_deals INTEGER NOT NULL DEFAULT 0,
+        last_seen TEXT,
+        PRIMARY KEY (field, key)
+    ) WITHOUT ROWID
+    """,
+]
+
+
+def coordinate_cell(lat, lon):
+    """Address cell for buyer coordinates; None for missing or unset (0, 0) coordinates"""
+    if lat is None or lon is None or (lat == 0 and lon == 0):
+        return None
+    return f"{round(float(lat), COORDINATE_DECIMALS)},{round(float(lon), COORDINATE_DECIMALS)}"
+
+
+def _postings(buyer_name, ssn, buyer_lat, buyer_long):
+    """(field, key, value) postings for a buyer; empty keys are skipped"""
+    name, last4 = normalize_name(buyer_name), normalize_ssn(ssn)
+    cell = coordinate_cell(buyer_lat, buyer_long)
+    postings = []
+    if last4 and name:
+        postings.append(("buyer", name, last4))
+    if cell is not None and name:
+        postings.append(("coords", cell, buyer_identity(buyer_name, ssn)))
+    return postings
+
+
+def _same_ssn(values, last4, identity):
+    """Identities among coords posting `values` using SSN last 4 `last4` under another name"""
+    suffix = "|" + last4
+    return {value for value in values if value.endswith(suffix) and value != identity}
+
+
+class IdentityIndex:
+    def __init__(self, path=IDENTITY_INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    def lookup(self, buyer_name, ssn, seller_name, buyer_lat=None, buyer_long=None):
+        """Collisions of this transaction's identity with earlier ones.
+
+        Counts exclude the transaction's own identity, so a repeat buyer using the same
+        name, SSN and address has no collisions. `collisions` is the largest of them.
+        """
+        postings = _postings(buyer_name, ssn, buyer_lat, buyer_long)
+        seller = normalize_name(seller_name)
+        with self._lock:
+            counts = {}
+            for field, key, value in postings:
+                row = self._conn.execute(
+                    "SELECT distinct_values, EXISTS(SELECT 1 FROM postings WHERE field = ? AND key = ? AND value = ?) "
+                    "FROM keys WHERE field = ? AND key = ?",
+                    (field, key, value, field, key),
+                ).fetchone()
+                counts[field] = row[0] - row[1] if row else 0
+                if field == "coords":
+                    counts["ssn"] = len(self._stored_same_ssn(key, value))
+            row = self._conn.execute(
+                "SELECT fast_deals FROM keys WHERE field = 'seller' AND key = ?", (seller,)
+            ).fetchone() if seller else None
+        result = {
+            "ssn_other_names": counts.get("ssn", 0),
+            "name_other_ssns": counts.get("buyer", 0),
+            "address_other_buyers": counts.get("coords", 0),
+            "seller_fast_deals": row[0] if row else 0,
+        }
+        result["collisions"] = max(result.values())
+        return result
+
+    def _stored_same_ssn(self, cell, identity):
+        last4 = identity.rsplit("|", 1)[1]
+        values = [row[0] for row in self._conn.execute(
+            "SELECT value FROM postings WHERE field = 'coords' AND key = ? AND value LIKE ?", (cell, "%|" + last4)
+        )]
+        return _same_ssn(values, last4, identity)
+
+    def lookup_many(self, rows, pending=None, sequential=True):
+        """`lookup` for (buyer_name, ssn, seller_name, buyer_lat, buyer_long, fast_closing) rows.
+
+        Each row sees the rows before it as if they had already been recorded, so a
+        batch gets the same results as checking its transactions one at a time.
+        `pending` holds those not-yet-recorded rows; pass the same dict to successive
+        calls to carry it across the chunks of one batch. With `sequential=False`
+        every row is looked up against the index alone, as `lookup` would.
+        """
+        if pending is None or not sequential:
+            pending = {"postings": {}, "fast_deals": {}}
+        new_values = pending.setdefault("postings", {})     # (field, key) -> values not in the index
+        new_fast_deals = pending.setdefault("fast_deals", {})
+        distinct, stored, fast_deals, same_ssn = {}, {}, {}, {}
+        results = []
+        with self._lock:
+            for buyer_name, ssn, seller_name, buyer_lat, buyer_long, fast_closing in rows:
+                counts = {}
+                for field, key, value in _postings(buyer_name, ssn, buyer_lat, buyer_long):
+                    if (field, key) not in distinct:
+                        row = self._conn.execute(
+                            "SELECT distinct_values FROM keys WHERE field = ? AND key = ?", (field, key)
+                        ).fetchone()
+                        distinct[field, key] = row[0] if row else 0
+                    if (field, key, value) not in stored:
+                        stored[field, key, value] = self._conn.execute(
+                            "SELECT EXISTS(SELECT 1 FROM postings WHERE field = ? AND key = ? AND value = ?)",
+                            (field, key, value),
+                        ).fetchone()[0] == 1
+                    added = new_values.setdefault((field, key), set())
+                    own = stored[field, key, value] or value in added
+                    counts[field] = distinct[field, key] + len(added) - own
+                    if field == "coords":
+                        if (key, value) not in same_ssn:
+                            same_ssn[key, value] = self._stored_same_ssn(key, value)
+                        counts["ssn"] = len(same_ssn[key, value] | _same_ssn(added, value.rsplit("|", 1)[1], value))
+                    if sequential and not stored[field, key, value]:
+                        added.add(value)
+                seller = normalize_name(seller_name)
+                if seller and seller not in fast_deals:
+                    row = self._conn.execute(
+                        "SELECT fast_deals FROM keys WHERE field = 'seller' AND key = ?", (seller,)
+                    ).fetchone()
+                    fast_deals[seller] = row[0] if row else 0
+                result = {
+                    "ssn_other_names": counts.get("ssn", 0),
+                    "name_other_ssns": counts.get("buyer", 0),
+                    "address_other_buyers": counts.get("coords", 0),
+                    "seller_fast_deals": fast_deals[seller] + new_fast_deals.get(seller, 0) if seller else 0,
+                }
+                result["collisions"] = max(result.values())
+                results.append(result)
+                if sequential and seller and fast_closing:
+                    new_fast_deals[seller] = new_fast_deals.get(seller, 0) + 1
+        return results
+
+    def record(self, buyer_name, ssn, seller_name, buyer_lat=None, buyer_long=None, fast_closing=False, seen_at=None):
+        self.record_many([(buyer_name, ssn, seller_name, buyer_lat, buyer_long, fast_closing, seen_at)])
+
+    def record_many(self, rows):
+        """Fold (buyer_name, ssn, seller_name, buyer_lat, buyer_long, fast_closing, seen_at) rows in one transaction"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for buyer_name, ssn, seller_name, buyer_lat, buyer_long, fast_closing, seen_at in rows:
+                    seen_at = seen_at or now
+                    for field, key, value in _postings(buyer_name, ssn, buyer_lat, buyer_long):
+                        added = self._conn.execute(
+                            "INSERT OR IGNORE INTO postings VALUES (?, ?, ?)", (field, key, value)
+                        ).rowcount
+                        self._conn.execute(
+                            """
+                            INSERT INTO keys (field, key, distinct_values, last_seen) VALUES (?, ?, ?, ?)
+                            ON CONFLICT(field, key) DO UPDATE SET
+                                distinct_values = distinct_values + excluded.distinct_values,
+                                last_seen = MAX(last_seen, excluded.last_seen)
+                            """,
+                            (field, key, added, seen_at),
+                        )
+                    seller = normalize_name(seller_name)
+                    if seller and fast_closing:
+                        self._conn.execute(
+                            """
+                            INSERT INTO keys (field, key, fast_deals, last_seen) VALUES ('seller', ?, 1, ?)
+                            ON CONFLICT(field, key) DO UPDATE SET
+                                fast_deals = fast_deals + 1,
+                                last_seen = MAX(last_seen, excluded.last_seen)
+                            """,
+                            (seller, seen_at),
+                        )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def rebuild_from_history(self, history_log, batch_size=10_000):
+        """Recreate the index from every record in a CheckHistoryLog"""
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM keys")
+        batch = []
+        for record in history_log.iter_records():
+            timing = record.get("checks", {}).get("transaction_timing", {})
+            batch.append((
+                record.get("buyer_name"), record.get("ssn_last4"), record.get("seller_name"),
+                record.get("buyer_lat"), record.get("buyer_long"),
+                timing.get("passed") is False, record.get("timestamp"),
+            ))
+            if len(batch) >= batch_size:
+                self.record_many(batch)
+                batch = []
+        if batch:
+            self.record_many(batch)
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_identity_index(path=IDENTITY_INDEX_FILE):
+    """Process-wide index instance, shared across Streamlit sessions and reruns"""
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = IdentityIndex(path)
+        return _indexes[path]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the identity collision index")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from the check history")
+    parser.add_argument("--index", default=IDENTITY_INDEX_FILE)
+    parser.add_argument("--history", default=CHECKS_HISTORY_DIR)
+    args = parser.parse_args()
+    index = IdentityIndex(args.index)
+    if args.rebuild:
+        print(f"Indexed {index.rebuild_from_history(CheckHistoryLog(args.history))} keys")
@@ -0,0 +1,78 @@
+"""Import-time budget report for the app's views.
+
+    python import_budget.py              # per-module cost of each view, exit 1 if over budget
+    python import_budget.py --top 30
+
+Each view's imports run in a fresh interpreter under `python -X importtime`, so
+the numbers are cold-start costs. The login page must stay within its budget;
+the other views are reported so a new heavy dependency shows up in review.
+"""
+import argparse
+import subprocess
+import sys
+
+# View -> modules it imports (in addition to the views before it) and its budget in ms
+VIEWS = [
+    ("login", ["streamlit", "user_store", "timing"], 1500),
+    ("app", ["pandas", "fraud_engine", "rule_plan", "geo", "check_history", "buyer_index",
+             "identity_index", "risk_zones", "document_store", "document_verifier",
+             "transaction_store", "memo", "drift_monitor"], None),
+    ("fraud_check", ["model_service", "batch_check"], None),
+    ("insights", ["matplotlib.pyplot"], None),
+    ("admin", ["rescoring", "what_if"], None),
+]
+
+
+def measure(modules, preloaded=()):
+    """(total ms, [(module, self ms, cumulative ms), ...]) for importing `modules` cold"""
+    preload = "".join(f"import {name}\n" for name in preloaded)
+    # Modules already loaded by earlier views are imported first, before timing starts
+    code = preload + "import sys; sys.stderr.write('--- start\\n')\n" + "".join(f"import {name}\n" for name in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    lines = result.stderr.split("--- start\n", 1)[-1].splitlines()
+
+    entries = []
+    total = 0.0
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name[1:].rstrip()
+        cumulative_ms = int(cumulative_us) / 1000
+        # Nested imports are indented; top-level ones add up to the view's total
+        if not name.startswith(" "):
+            total += cumulative_ms
+        entries.append((name.strip(), int(self_us) / 1000, cumulative_ms))
+    return total, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report per-module import cost of each app view")
+    parser.add_argument("--top", type=int, default=15, help="Modules listed per view, by self time")
+    args = parser.parse_args()
+
+    over_budget = False
+    loaded = []
+    for view, modules, budget_ms in VIEWS:
+        try:
+            total, entries = measure(modules, loaded)
+        except RuntimeError as e:
+            print(f"{view}: not measured ({e})")
+            over_budget |= budget_ms is not None
+            continue
+        loaded.extend(modules)
+        status = ""
+        if budget_ms is not None:
+            status = f" (budget {budget_ms} ms: {'OK' if total <= budget_ms else 'OVER'})"
+            over_budget |= total > budget_ms
+        print(f"{view}: {total:.1f} ms{status}")
+        for name, self_ms, cumulative_ms in sorted(entries, key=lambda e: e[1], reverse=True)[:args.top]:
+            print(f"    {self_ms:8.1f} ms self {cumulative_ms:9.1f} ms cumulative  {name}")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
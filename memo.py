@@ -0,0 +1,84 @@
+"""Bounded LRU memoization shared by every Streamlit session in the process.
+
+Keys are plain tuples: a computation's inputs plus a fingerprint of the data it
+reads (a file's mtime and size, a store's aggregates version, a compiled plan's
+mtime). When the data changes, the fingerprint changes, so stale entries are
+never hit again; they just age out of the LRU.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = 1024
+
+
+class LRUCache:
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Cached value for `key`, calling `compute()` on a miss.
+
+        Concurrent misses on the same key may both compute; the result is the same
+        and the last one stored wins.
+        """
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._items), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+def file_fingerprint(path):
+    """(mtime, size) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+_memos = {}
+_memos_lock = threading.Lock()
+
+
+def get_memo(name, maxsize=DEFAULT_MAXSIZE):
+    """Process-wide named cache"""
+    with _memos_lock:
+        if name not in _memos:
+            _memos[name] = LRUCache(maxsize)
+        return _memos[name]
+
+
+def memo_stats():
+    with _memos_lock:
+        return {name: memo.stats() for name, memo in sorted(_memos.items())}
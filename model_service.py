@@ -0,0 +1,100 @@
+import os
+import threading
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from geo import haversine_km
+from memo import file_fingerprint
+
+MODEL_FILE = "real_estate_fraud_model.jb"
+ENCODERS_FILE = "real_estate_label_encoders.jb"
+
+# The model was trained on transactions_log.csv column names; the Fraud Check form
+# uses its own names for the same fields
+FEATURE_ALIASES = {
+    "location_lat": "latitude",
+    "location_long": "longitude",
+    "buyer_lat": "buyer_latitude",
+    "buyer_long": "buyer_longitude",
+}
+
+# Code given to categories the encoders never saw (LightGBM treats negatives as missing)
+UNKNOWN_CODE = -1
+
+
+class ModelScoringService:
+    """Fraud model plus label encoders, loaded once and scored in batches.
+
+    Each fitted LabelEncoder is turned into a pair of lookup arrays (class labels as
+    sorted strings, and the encoder code of each), so encoding a whole column is a
+    single `np.searchsorted` instead of a per-row transform.
+    """
+
+    def __init__(self, model_path=MODEL_FILE, encoders_path=ENCODERS_FILE, n_threads=None):
+        # (mtime, size) of the files as loaded; the service never reloads, so results
+        # it produced stay tied to these files even after they are replaced
+        self.fingerprint = (file_fingerprint(model_path), file_fingerprint(encoders_path))
+        model = joblib.load(model_path)
+        self.booster = model.booster_ if hasattr(model, "booster_") else model
+        self.feature_names = list(self.booster.feature_name())
+        self.n_threads = n_threads or os.cpu_count() or 1
+        self.category_lookups = {}
+        for column, encoder in joblib.load(encoders_path).items():
+            labels = np.asarray(encoder.classes_).astype(str)
+            order = np.argsort(labels)
+            self.category_lookups[column] = (labels[order], order)
+
+    def encode(self, column, values):
+        """Map raw category values to encoder codes using the precomputed lookup"""
+        labels, codes = self.category_lookups[column]
+        values = np.asarray(values).astype(str)
+        positions = np.minimum(np.searchsorted(labels, values), len(labels) - 1)
+        return np.where(labels[positions] == values, codes[positions], UNKNOWN_CODE)
+
+    def build_features(self, data):
+        """Feature matrix in model column order; absent features are left missing"""
+        if hasattr(data, "to_pandas"):
+            data = data.to_pandas()
+        df = data.rename(columns={k: v for k, v in FEATURE_ALIASES.items() if v not in data.columns})
+        if "distance" in self.feature_names and "distance" not in df.columns and \
+                {"latitude", "longitude", "buyer_latitude", "buyer_longitude"} <= set(df.columns):
+            df = df.assign(distance=haversine_km(
+                df["latitude"], df["longitude"], df["buyer_latitude"], df["buyer_longitude"]
+            ))
+
+        features = np.full((len(df), len(self.feature_names)), np.nan, dtype=np.float64)
+        for i, name in enumerate(self.feature_names):
+            if name not in df.columns:
+                continue
+            if name in self.category_lookups:
+                features[:, i] = self.encode(name, df[name].to_numpy())
+            else:
+                features[:, i] = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)
+        return features
+
+    def predict_proba(self, data, n_threads=None, batch_size=100_000):
+        """Fraud probability for every row of a DataFrame, Arrow table or list of dicts"""
+        if isinstance(data, (list, tuple)):
+            data = pd.DataFrame(list(data))
+        features = self.build_features(data)
+        n_threads = n_threads or self.n_threads
+        probabilities = np.empty(len(features), dtype=np.float64)
+        for start in range(0, len(features), batch_size):
+            stop = start + batch_size
+            probabilities[start:stop] = self.booster.predict(features[start:stop], num_threads=n_threads)
+        return probabilities
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_model_service(model_path=MODEL_FILE, encoders_path=ENCODERS_FILE):
+    """Process-wide scoring service, shared across Streamlit sessions and reruns"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ModelScoringService(model_path, encoders_path)
+        return _service
@@ -0,0 +1,340 @@
+"""Rescore the whole check history against the current fraud_metrics.json thresholds.
+
+    python rescoring.py                     # rescore with all cores
+    python rescoring.py --workers 8
+
+The job runs in two parallel phases on a process pool:
+
+1. Each history segment's check values are parsed (pyarrow's JSON reader) into an
+   uncompressed Arrow IPC file under rescoring/inputs/. These are cached by
+   segment size, so after the first run only new history is parsed.
+2. The input files are split into row ranges; each worker memory-maps its file
+   (zero-copy, shared through the page cache) and re-applies the rules to the
+   stored check values.
+
+Verdicts go to a new versioned result set, rescoring/v000001/, as Parquet parts
+plus a manifest.json with the thresholds used and how many risk levels changed.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+
+from check_history import CHECKS_HISTORY_DIR, CheckHistoryLog
+from fraud_engine import score_columns
+from rule_plan import CHECK_DEFINITIONS, FRAUD_METRICS_FILE, RISK_BANDS, RulePlan
+
+RESCORING_DIR = "rescoring"
+INPUTS_DIR = "inputs"
+MANIFEST_FILE = "manifest.json"
+
+# Rows scored per task
+DEFAULT_TASK_ROWS = 1_000_000
+
+# Records saved before a check existed have no value for it; these fills make such
+# a check pass rather than add its weight
+_PASSING_FILL = {"le": -np.inf, "ge": np.inf, "is_true": True, "is_false": False}
+
+# Input column -> Arrow type of the stored check value
+_VALUE_TYPES = {
+    "documents_valid": pa.bool_(),
+    "in_high_risk_zone": pa.bool_(),
+}
+
+
+def _history_schema():
+    """Explicit schema for the history fields rescoring needs; everything else is skipped"""
+    checks = pa.struct([
+        pa.field(check_id, pa.struct([pa.field("value", _VALUE_TYPES.get(column, pa.float64()))]))
+        for check_id, (_, column, _) in CHECK_DEFINITIONS.items()
+    ])
+    return pa.schema([
+        pa.field("timestamp", pa.string()),
+        pa.field("buyer_name", pa.string()),
+        pa.field("risk_score", pa.float64()),
+        pa.field("checks", checks),
+    ])
+
+
+def _input_path(directory, segment):
+    return os.path.join(directory, INPUTS_DIR, os.path.basename(segment).rsplit(".", 1)[0] + ".arrow")
+
+
+def parse_segment(segment, output_path):
+    """Phase 1: flatten one history segment into an Arrow IPC file of rule inputs"""
+    with open(segment, "rb") as f:
+        data = f.read()
+    # The active segment may end in a record still being written
+    data = data[:data.rfind(b"\n") + 1]
+
+    columns = {"segment": [], "timestamp": [], "buyer_name": [], "original_risk_score": []}
+    columns.update({column: [] for _, column, _ in CHECK_DEFINITIONS.values()})
+    if data:
+        table = pa_json.read_json(
+            pa.py_buffer(data),
+            parse_options=pa_json.ParseOptions(explicit_schema=_history_schema(),
+                                               unexpected_field_behavior="ignore"),
+        )
+        checks = table.column("checks").combine_chunks()
+        columns = {
+            "timestamp": table.column("timestamp"),
+            "buyer_name": table.column("buyer_name"),
+            "original_risk_score": table.column("risk_score"),
+        }
+        for check_id, (_, column, _) in CHECK_DEFINITIONS.items():
+            columns[column] = checks.field(check_id).field("value")
+        columns["segment"] = pa.array([os.path.basename(segment)] * table.num_rows, pa.string())
+        table = pa.table(columns)
+    else:
+        table = pa.table({name: pa.array([], pa.string()) for name in columns})
+
+    tmp_path = output_path + ".tmp"
+    with ipc.new_file(tmp_path, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, output_path)
+    return table.num_rows
+
+
+def _rule_inputs(table):
+    """Rule input column -> numpy array, with missing values filled to pass"""
+    columns = {}
+    for _, column, comparator in CHECK_DEFINITIONS.values():
+        values = table.column(column)
+        if values.null_count == table.num_rows:
+            continue  # check not recorded in this part of the history
+        if values.null_count:
+            values = values.fill_null(_PASSING_FILL[comparator])
+        columns[column] = values.to_numpy()
+    return columns
+
+
+def score_range(input_path, start, stop, metrics, output_path):
+    """Phase 2: score rows [start, stop) of a memory-mapped input file into one Parquet part"""
+    with pa.memory_map(input_path, "r") as source:
+        table = ipc.open_file(source).read_all().slice(start, stop - start)
+        columns = _rule_inputs(table)
+        result = score_columns(columns, RulePlan(metrics)) if columns else {}
+
+    original = table.column("original_risk_score").to_numpy(zero_copy_only=False)
+    output = {
+        "segment": table.column("segment"),
+        "timestamp": table.column("timestamp"),
+        "buyer_name": table.column("buyer_name"),
+    }
+    for name, values in result.items():
+        if name.endswith("_passed") or name in ("risk_score", "risk_level"):
+            output[name] = values
+    output["original_risk_score"] = original
+    pq.write_table(pa.table(output), output_path)
+
+    changed = 0
+    if "risk_score" in result:
+        original_level = _risk_levels(original)
+        changed = int(np.sum((original_level != result["risk_level"]) & ~np.isnan(original)))
+    return stop - start, changed
+
+
+def _risk_levels(scores):
+    bands = [band for _, band in RISK_BANDS]
+    return np.select([scores >= minimum for minimum, _ in RISK_BANDS], bands, default=bands[-1])
+
+
+def refresh_inputs(segments, directory=RESCORING_DIR, pool=None, on_progress=None):
+    """Phase 1: parse history segments whose input file is missing or out of date.
+
+    Parses on `pool` (an executor) when given, else in this process. Calls
+    `on_progress(done, total)` after each segment.
+    """
+    os.makedirs(os.path.join(directory, INPUTS_DIR), exist_ok=True)
+    stale = []
+    for segment in segments:
+        input_path = _input_path(directory, segment)
+        meta_path = input_path + ".json"
+        size = os.path.getsize(segment)
+        if os.path.exists(input_path) and os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                if json.load(f).get("size") == size:
+                    continue
+        stale.append((segment, input_path, meta_path, size))
+
+    if on_progress:
+        on_progress(0, len(stale))
+    if pool is None:
+        results = ((parse_segment(segment, input_path), meta_path, size)
+                   for segment, input_path, meta_path, size in stale)
+    else:
+        futures = {pool.submit(parse_segment, segment, input_path): (meta_path, size)
+                   for segment, input_path, meta_path, size in stale}
+        results = ((future.result(), *futures[future]) for future in as_completed(futures))
+    for done, (rows, meta_path, size) in enumerate(results, 1):
+        with open(meta_path, "w") as f:
+            json.dump({"size": size, "rows": rows}, f)
+        if on_progress:
+            on_progress(done, len(stale))
+
+
+def input_rows(segment, directory=RESCORING_DIR):
+    with open(_input_path(directory, segment) + ".json", "r") as f:
+        return json.load(f)["rows"]
+
+
+def read_input_columns(segments, directory=RESCORING_DIR):
+    """Every segment's rule inputs concatenated, as numpy arrays (missing values filled to pass)"""
+    tables = []
+    for segment in segments:
+        with pa.memory_map(_input_path(directory, segment), "r") as source:
+            table = ipc.open_file(source).read_all()
+        if table.num_rows:
+            tables.append(table)
+    if not tables:
+        return {}
+    return _rule_inputs(pa.concat_tables(tables, promote_options="permissive"))
+
+
+def _next_version(directory):
+    versions = [int(name[1:]) for name in os.listdir(directory) if name.startswith("v") and name[1:].isdigit()]
+    return max(versions, default=0) + 1
+
+
+def list_versions(directory=RESCORING_DIR):
+    """Manifests of completed result sets, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        path = os.path.join(directory, name, MANIFEST_FILE)
+        if name.startswith("v") and os.path.exists(path):
+            with open(path, "r") as f:
+                manifests.append(json.load(f))
+    return manifests
+
+
+def result_dataset(version, directory=RESCORING_DIR):
+    """Arrow dataset over one result set's Parquet parts"""
+    output_dir = os.path.join(directory, f"v{version:06d}")
+    parts = sorted(os.path.join(output_dir, name) for name in os.listdir(output_dir) if name.endswith(".parquet"))
+    return ds.dataset(parts, format="parquet")
+
+
+class RescoringJob:
+    """One rescoring run at a time per process, with progress readable from any thread"""
+
+    def __init__(self, history_dir=CHECKS_HISTORY_DIR, metrics_file=FRAUD_METRICS_FILE,
+                 directory=RESCORING_DIR, workers=None, task_rows=DEFAULT_TASK_ROWS):
+        self.history_dir = history_dir
+        self.metrics_file = metrics_file
+        self.directory = directory
+        self.workers = workers or os.cpu_count()
+        self.task_rows = task_rows
+        self._lock = threading.Lock()
+        self._thread = None
+        self._progress = {"state": "idle"}
+
+    def progress(self):
+        with self._lock:
+            return dict(self._progress)
+
+    def _update(self, **changes):
+        with self._lock:
+            self._progress.update(changes)
+
+    def start(self):
+        """Run in a background thread; returns False if a run is already in progress"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._progress = {"state": "running", "phase": "starting", "done": 0, "total": 0,
+                              "started": datetime.now().isoformat()}
+            self._thread = threading.Thread(target=self._run_safely, name="rescoring", daemon=True)
+            self._thread.start()
+        return True
+
+    def _run_safely(self):
+        try:
+            manifest = self.run()
+            self._update(state="done", finished=datetime.now().isoformat(), version=manifest["version"])
+        except Exception as e:
+            self._update(state="failed", finished=datetime.now().isoformat(), error=str(e))
+
+    def run(self):
+        started = time.perf_counter()
+        with open(self.metrics_file, "r") as f:
+            metrics = json.load(f)
+        segments = CheckHistoryLog(self.history_dir).segments()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            refresh_inputs(segments, self.directory, pool,
+                           lambda done, total: self._update(phase="parsing", done=done, total=total))
+
+            # Phase 2: score row ranges of the memory-mapped inputs
+            version = _next_version(self.directory)
+            output_dir = os.path.join(self.directory, f"v{version:06d}")
+            os.makedirs(output_dir)
+            tasks = []
+            for segment in segments:
+                input_path = _input_path(self.directory, segment)
+                rows = input_rows(segment, self.directory)
+                for start in range(0, rows, self.task_rows):
+                    tasks.append((input_path, start, min(rows, start + self.task_rows)))
+            total_rows = sum(stop - start for _, start, stop in tasks)
+            self._update(phase="scoring", done=0, total=total_rows)
+            futures = [
+                pool.submit(score_range, input_path, start, stop, metrics,
+                            os.path.join(output_dir, f"part-{number:06d}.parquet"))
+                for number, (input_path, start, stop) in enumerate(tasks)
+            ]
+            scored = changed = 0
+            for future in as_completed(futures):
+                rows, part_changed = future.result()
+                scored += rows
+                changed += part_changed
+                self._update(done=scored)
+
+        manifest = {
+            "version": version,
+            "created": datetime.now().isoformat(),
+            "metrics_file": os.path.abspath(self.metrics_file),
+            "thresholds": {check_id: rule.threshold for check_id, rule in RulePlan(metrics).rules.items()},
+            "records": scored,
+            "risk_level_changes": changed,
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+        with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def get_rescoring_job(directory=RESCORING_DIR):
+    """Process-wide job handle, so progress survives Streamlit reruns"""
+    with _jobs_lock:
+        if directory not in _jobs:
+            _jobs[directory] = RescoringJob(directory=directory)
+        return _jobs[directory]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore the check history with the current thresholds")
+    parser.add_argument("--history", default=CHECKS_HISTORY_DIR)
+    parser.add_argument("--metrics-file", default=FRAUD_METRICS_FILE)
+    parser.add_argument("--output", default=RESCORING_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Defaults to all cores")
+    parser.add_argument("--task-rows", type=int, default=DEFAULT_TASK_ROWS)
+    args = parser.parse_args()
+    job = RescoringJob(args.history, args.metrics_file, args.output, args.workers, args.task_rows)
+    result = job.run()
+    print(f"v{result['version']:06d}: {result['records']} records rescored in {result['seconds']}s, "
+          f"{result['risk_level_changes']} risk levels changed")
@@ -0,0 +1,218 @@
+"""High-risk zone polygons and a grid index for the location_risk_check.
+
+Zones are read from a GeoJSON FeatureCollection of Polygon / MultiPolygon features
+whose `category` property names one of the location_risk_check high_risk_areas
+(and optionally a `name`). Polygons are bucketed into a uniform lat/lon grid, so a
+point query only runs the point-in-polygon test against the few zones whose
+bounding boxes overlap the point's cell.
+"""
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+RISK_ZONES_FILE = "high_risk_zones.geojson"
+
+# Grid cell size in degrees (0.05 deg is about 5.5 km)
+DEFAULT_CELL_SIZE = 0.05
+
+MAX_TEST_CELLS = 4_000_000
+
+
+def _polygons_from_geometry(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def _cell_key(row, col):
+    """Pack a grid (row, col) into one integer; same value for Python ints and int64 arrays"""
+    return (row << 32) + (col & 0xFFFFFFFF)
+
+
+def _ring_contains(ring, lat, lon):
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        lon_i, lat_i = ring[i][0], ring[i][1]
+        lon_j, lat_j = ring[j][0], ring[j][1]
+        if (lat_i > lat) != (lat_j > lat) and \
+                lon < (lon_j - lon_i) * (lat - lat_i) / (lat_j - lat_i) + lon_i:
+            inside = not inside
+        j = i
+    return inside
+
+
+class RiskZoneIndex:
+    """Immutable grid index over zone polygons (GeoJSON order: [lon, lat])"""
+
+    def __init__(self, features, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.zones = []      # zone index -> {"name", "category"}
+        self.rings = []      # polygon index -> list of rings (outer ring first, then holes)
+        self.edges = []      # polygon index -> (lon1, lat1, lon2, lat2) edge arrays, all rings
+        self.polygon_zone = []
+        self.cells = {}      # cell key -> list of polygon indices
+
+        for feature in features:
+            properties = feature.get("properties") or {}
+            zone_id = len(self.zones)
+            self.zones.append({
+                "name": properties.get("name", f"Zone {zone_id + 1}"),
+                "category": properties.get("category", "High risk area"),
+            })
+            for polygon in _polygons_from_geometry(feature["geometry"]):
+                self._add_polygon(polygon, zone_id)
+
+    def _cell(self, lat, lon):
+        return _cell_key(math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def _add_polygon(self, polygon, zone_id):
+        polygon_id = len(self.rings)
+        rings = [[(float(p[0]), float(p[1])) for p in ring] for ring in polygon]
+        self.rings.append(rings)
+        self.polygon_zone.append(zone_id)
+
+        starts = np.array([p for ring in rings for p in ring], dtype=np.float64)
+        ends = np.array([p for ring in rings for p in ring[1:] + ring[:1]], dtype=np.float64)
+        self.edges.append((starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1]))
+
+        outer = np.array(rings[0], dtype=np.float64)
+        min_row, max_row = (math.floor(v / self.cell_size) for v in (outer[:, 1].min(), outer[:, 1].max()))
+        min_col, max_col = (math.floor(v / self.cell_size) for v in (outer[:, 0].min(), outer[:, 0].max()))
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                self.cells.setdefault(_cell_key(row, col), []).append(polygon_id)
+
+    def __len__(self):
+        return len(self.zones)
+
+    def zone_at(self, lat, lon):
+        """Zone dict containing one point, or None; pure Python for single-check latency"""
+        for polygon_id in self.cells.get(self._cell(lat, lon), ()):
+            inside = False
+            for ring in self.rings[polygon_id]:
+                if _ring_contains(ring, lat, lon):
+                    inside = not inside
+            if inside:
+                return self.zones[self.polygon_zone[polygon_id]]
+        return None
+
+    def zone_ids(self, lats, lons):
+        """Zone index containing each point (-1 for none), vectorized over arrays"""
+        shape = np.shape(lats)
+        lats = np.asarray(lats, dtype=np.float64).ravel()
+        lons = np.asarray(lons, dtype=np.float64).ravel()
+        result = np.full(lats.shape, -1, dtype=np.int64)
+        if not self.cells or lats.size == 0:
+            return result.reshape(shape)
+
+        rows = np.floor(lats / self.cell_size).astype(np.int64)
+        cols = np.floor(lons / self.cell_size).astype(np.int64)
+        cell_keys = _cell_key(rows, cols)
+
+        # Group points by cell, then collect each polygon's candidate points from its cells
+        order = np.argsort(cell_keys, kind="stable")
+        keys, starts, counts = np.unique(cell_keys[order], return_index=True, return_counts=True)
+        candidates = {}
+        for key, start, count in zip(keys.tolist(), starts.tolist(), counts.tolist()):
+            for polygon_id in self.cells.get(key, ()):
+                candidates.setdefault(polygon_id, []).append(order[start:start + count])
+
+        for polygon_id, groups in candidates.items():
+            points = np.concatenate(groups)
+            points = points[result[points] == -1]
+            lon1, lat1, lon2, lat2 = self.edges[polygon_id]
+            # Bound the points x edges temporary to a few million cells
+            block = max(1, MAX_TEST_CELLS // len(lon1))
+            for start in range(0, points.size, block):
+                chunk = points[start:start + block]
+                y = lats[chunk][:, None]
+                x = lons[chunk][:, None]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    crosses = ((lat1 > y) != (lat2 > y)) & (x < (lon2 - lon1) * (y - lat1) / (lat2 - lat1) + lon1)
+                inside = (crosses.sum(axis=1) % 2) == 1
+                result[chunk[inside]] = self.polygon_zone[polygon_id]
+        return result.reshape(shape)
+
+    def contains(self, lats, lons):
+        return self.zone_ids(lats, lons) >= 0
+
+
+def load_risk_zone_index(path=RISK_ZONES_FILE, cell_size=DEFAULT_CELL_SIZE):
+    with open(path, "r") as f:
+        geojson = json.load(f)
+    return RiskZoneIndex(geojson.get("features", []), cell_size)
+
+
+class RiskZones:
+    """Holds the current zone index and swaps in a rebuilt one when the file changes.
+
+    Rebuilds run on a background thread; scoring keeps using the previous index
+    until the new one is ready, so a reload never blocks a check.
+    """
+
+    def __init__(self, path=RISK_ZONES_FILE, cell_size=DEFAULT_CELL_SIZE):
+        self.path = path
+        self.cell_size = cell_size
+        self.current = None
+        self._mtime = None
+        self._reloading = None
+        self._lock = threading.Lock()
+
+    def _reload(self, mtime):
+        try:
+            index = load_risk_zone_index(self.path, self.cell_size)
+        except (OSError, ValueError, KeyError):
+            # A half-written or broken zone file keeps the previous index in service
+            index = self.current
+        with self._lock:
+            self.current = index
+            self._mtime = mtime
+            self._reloading = None
+
+    def maybe_reload(self, wait=False):
+        """Start a background rebuild if the zone file changed; returns the current index"""
+        return self.snapshot(wait)[0]
+
+    def snapshot(self, wait=False):
+        """`maybe_reload`, returning (index, mtime_ns of the zone file it was loaded from).
+
+        Both are read under one lock, so a background reload finishing in between
+        cannot pair one index with another file's mtime.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            if mtime == self._mtime or self._reloading is not None:
+                thread = self._reloading
+            elif mtime is None:
+                self.current, self._mtime = None, None
+                thread = None
+            else:
+                thread = threading.Thread(target=self._reload, args=(mtime,), daemon=True)
+                self._reloading = thread
+                thread.start()
+        if wait and thread is not None:
+            thread.join()
+        with self._lock:
+            return self.current, self._mtime
+
+
+_zones = {}
+_zones_lock = threading.Lock()
+
+
+def get_risk_zones(path=RISK_ZONES_FILE):
+    """Process-wide zone holder; the first call loads the file synchronously"""
+    with _zones_lock:
+        if path not in _zones:
+            _zones[path] = RiskZones(path)
+            _zones[path].maybe_reload(wait=True)
+        return _zones[path]
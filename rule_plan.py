@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+FRAUD_METRICS_FILE = "fraud_metrics.json"
+
+# Check id -> (metric id in fraud_metrics.json, input column, comparator).
+# A check passes when `value <comparator> threshold` holds.
+CHECK_DEFINITIONS = {
+    "distance": ("distance_check", "distance", "le"),
+    "property_value": ("property_value_check", "property_value", "le"),
+    "mortgage_ratio": ("mortgage_ratio_check", "mortgage_ratio", "le"),
+    "transaction_timing": ("transaction_timing_check", "transaction_days", "ge"),
+    "price_per_sqm": ("price_per_sqm_check", "price_per_sqm", "le"),
+    "document_verification": ("document_verification_check", "documents_valid", "is_true"),
+    "buyer_history": ("buyer_history_check", "buyer_transaction_count", "ge"),
+    "location_risk": ("location_risk_check", "in_high_risk_zone", "is_false"),
+    "identity_collision": ("identity_collision_check", "identity_collisions", "le"),
+}
+
+COMPARATORS = {
+    "le": lambda values, threshold: values <= threshold,
+    "ge": lambda values, threshold: values >= threshold,
+    "is_true": lambda values, threshold: np.asarray(values, dtype=bool),
+    "is_false": lambda values, threshold: ~np.asarray(values, dtype=bool),
+}
+
+# Risk bands by minimum score, highest first
+RISK_BANDS = [(5, "High"), (3, "Medium"), (0, "Low")]
+
+Rule = namedtuple("Rule", ["check_id", "metric_id", "column", "comparator", "threshold", "weight", "metric"])
+
+
+class RulePlan:
+    """fraud_metrics.json compiled into an index of check id -> rule.
+
+    Everything a check needs (comparator, threshold, weight and the metric's display
+    text) is resolved once at compile time, so scoring does no parsing or searching.
+    """
+
+    def __init__(self, metrics, mtime=None):
+        self.metrics = metrics
+        self.mtime = mtime
+        self.rules = {}
+        for check_id, (metric_id, column, comparator) in CHECK_DEFINITIONS.items():
+            metric = metrics["metrics"][metric_id]
+            self.rules[check_id] = Rule(
+                check_id=check_id,
+                metric_id=metric_id,
+                column=column,
+                comparator=COMPARATORS[comparator],
+                threshold=metric.get("threshold"),
+                weight=metrics["risk_levels"][metric["risk_level"]]["weight"],
+                metric=metric,
+            )
+        self.required_documents = metrics["metrics"]["document_verification_check"]["required_documents"]
+
+    def __getitem__(self, check_id):
+        return self.rules[check_id]
+
+    def passed(self, check_id, values):
+        rule = self.rules[check_id]
+        return rule.comparator(values, rule.threshold)
+
+    @staticmethod
+    def risk_band(score):
+        for minimum, band in RISK_BANDS:
+            if score >= minimum:
+                return band
+        return RISK_BANDS[-1][1]
+
+
+def compile_rule_plan(metrics):
+    return RulePlan(metrics)
+
+
+def as_rule_plan(plan_or_metrics):
+    """Accept a compiled plan, a raw metrics dict, or None (the cached default plan)"""
+    if plan_or_metrics is None:
+        return get_rule_plan()
+    if isinstance(plan_or_metrics, RulePlan):
+        return plan_or_metrics
+    return compile_rule_plan(plan_or_metrics)
+
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def get_rule_plan(path=FRAUD_METRICS_FILE):
+    """Process-wide compiled plan, recompiled only when the metrics file's mtime changes"""
+    mtime = os.stat(path).st_mtime_ns
+    with _plans_lock:
+        plan = _plans.get(path)
+        if plan is None or plan.mtime != mtime:
+            with open(path, 'r') as f:
+                plan = RulePlan(json.load(f), mtime)
+            _plans[path] = plan
+        return plan
@@ -0,0 +1,250 @@
+"""Score a large transaction file with the fraud_metrics.json rules, chunk by chunk.
+
+    python score_file.py transactions_log.csv scored.csv
+    python score_file.py transactions.parquet scored_parquet/ --chunksize 500000
+
+Buyer history and identity collisions are looked up in the buyer and identity
+indexes (each row against the saved history, without recording anything), and
+property coordinates in the high-risk zones, so rows get the same checks as the
+Fraud Check form. Only one chunk is held in memory at a time. Progress is
+checkpointed after every finished chunk, so re-running the same command after an
+interruption resumes from the last finished chunk (pass --restart to start over);
+a CSV input is resumed by seeking to the byte offset after that chunk. CSV output
+is a single file; Parquet output is a directory with one part file per chunk.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from buyer_index import BUYER_INDEX_FILE, get_buyer_index
+from fraud_engine import COLUMN_ALIASES, score_transactions
+from identity_index import IDENTITY_INDEX_FILE, get_identity_index
+from risk_zones import RISK_ZONES_FILE, get_risk_zones
+from rule_plan import FRAUD_METRICS_FILE, get_rule_plan
+
+# Every column the rule engine can read, under either naming scheme
+INPUT_COLUMNS = {
+    "distance", "property_value", "mortgage_amount", "property_size", "transaction_days",
+    "documents_valid", "location_lat", "location_long", "buyer_lat", "buyer_long",
+    "buyer_name", "seller_name", "ssn",
+} | set(COLUMN_ALIASES)
+
+DEFAULT_KEEP_COLUMNS = ["transaction_id"]
+
+# Bytes read at a time while looking for CSV record boundaries
+CSV_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def file_format(path):
+    if path.endswith(".parquet") or path.endswith(".pq") or os.path.isdir(path):
+        return "parquet"
+    return "csv"
+
+
+def _iter_csv_chunks(input_path, chunksize, usecols, offset=None):
+    """Yield (DataFrame of at most `chunksize` records, byte offset just after them).
+
+    Record boundaries are newlines outside quoted fields: a newline is one when an
+    even number of quotes precede it in the record (an escaped "" keeps the count
+    even). Resuming from a returned offset therefore seeks straight to the next
+    record, even when quoted fields contain newlines.
+    """
+    with open(input_path, "rb") as f:
+        header_line = f.readline()
+        names = next(csv.reader([header_line.decode("utf-8-sig")]))
+        start = f.tell() if offset is None else offset
+        f.seek(start)
+        data, ends, quotes = bytearray(), [], 0
+        while True:
+            block = f.read(CSV_BLOCK_SIZE)
+            if block:
+                buffer = np.frombuffer(block, dtype=np.uint8)
+                parity = (np.cumsum(buffer == ord('"')) + quotes) % 2
+                quotes = int(parity[-1])
+                ends.extend((np.flatnonzero((buffer == ord("\n")) & (parity == 0)) + len(data) + 1).tolist())
+                data += block
+            while len(ends) >= chunksize or (not block and data):
+                cut = ends[chunksize - 1] if len(ends) >= chunksize else len(data)
+                records = bytes(data[:cut])
+                del data[:cut]
+                ends = [end - cut for end in ends[chunksize:]]
+                start += cut
+                if records.strip():
+                    yield pd.read_csv(io.BytesIO(records), header=None, names=names, usecols=usecols,
+                                      dtype={"ssn": str}), start
+            if not block:
+                return
+
+
+def iter_chunks(input_path, chunksize, keep_columns, skip_rows=0, offset=None):
+    """Yield (DataFrame of at most `chunksize` rows, resume offset), reading only the needed columns.
+
+    The resume offset is the CSV byte offset after the chunk (None for Parquet,
+    which resumes by skipping `skip_rows` rows of whole batches).
+    """
+    wanted = INPUT_COLUMNS | set(keep_columns)
+    if file_format(input_path) == "parquet":
+        dataset = ds.dataset(input_path, format="parquet")
+        columns = [name for name in dataset.schema.names if name in wanted]
+        skipped = 0
+        for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+            # Resuming: batch boundaries are deterministic, so whole batches are skipped
+            if skipped < skip_rows:
+                skipped += batch.num_rows
+                continue
+            yield batch.to_pandas(), None
+    else:
+        yield from _iter_csv_chunks(input_path, chunksize, lambda name: name in wanted, offset)
+
+
+class Checkpoint:
+    """Records the chunks already written so an interrupted run can resume"""
+
+    def __init__(self, output_path, input_path, chunksize):
+        self.path = output_path.rstrip("/\\") + ".checkpoint.json"
+        self.state = {"input": os.path.abspath(input_path), "chunksize": chunksize,
+                      "chunks_done": 0, "rows_done": 0, "output_bytes": 0, "input_offset": None}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r") as f:
+            state = json.load(f)
+        if state["input"] != self.state["input"] or state["chunksize"] != self.state["chunksize"]:
+            raise SystemExit(f"{self.path} belongs to a different run; pass --restart to start over")
+        if file_format(state["input"]) == "csv" and state["rows_done"] and state.get("input_offset") is None:
+            raise SystemExit(f"{self.path} has no input offset to resume from; pass --restart to start over")
+        self.state = state
+        return True
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def history_columns(chunk, buyer_index, identity_index):
+    """buyer_transaction_count and identity_collisions for a chunk, when it has buyer names"""
+    if "buyer_name" not in chunk.columns:
+        return {}
+    names = chunk["buyer_name"].where(chunk["buyer_name"].notna(), None).tolist()
+    ssns = chunk["ssn"].where(chunk["ssn"].notna(), None).tolist() if "ssn" in chunk.columns else [None] * len(chunk)
+    sellers = chunk["seller_name"].where(chunk["seller_name"].notna(), None).tolist() \
+        if "seller_name" in chunk.columns else [None] * len(chunk)
+    coordinates = []
+    for name in ("buyer_lat", "buyer_long"):
+        alias = next(a for a, n in COLUMN_ALIASES.items() if n == name)
+        column = name if name in chunk.columns else alias if alias in chunk.columns else None
+        coordinates.append(chunk[column].where(chunk[column].notna(), None).tolist()
+                           if column else [None] * len(chunk))
+    collisions = identity_index.lookup_many(
+        zip(names, ssns, sellers, *coordinates, [False] * len(chunk)), sequential=False
+    )
+    return {
+        "buyer_transaction_count": buyer_index.lookup_many(zip(names, ssns), sequential=False),
+        "identity_collisions": [c["collisions"] for c in collisions],
+    }
+
+
+def write_chunk(result, output_path, chunk_number, first_chunk):
+    """Write one scored chunk and return the CSV output size after it (0 for Parquet)"""
+    if file_format(output_path) == "parquet":
+        os.makedirs(output_path, exist_ok=True)
+        part_path = os.path.join(output_path, f"part-{chunk_number:06d}.parquet")
+        pq.write_table(pa.Table.from_pandas(result, preserve_index=False), part_path)
+        return 0
+    with open(output_path, "w" if first_chunk else "a", newline="") as f:
+        result.to_csv(f, header=first_chunk, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def score_file(input_path, output_path, chunksize=100_000, keep_columns=None,
+               metrics_file=FRAUD_METRICS_FILE, restart=False, log=sys.stderr,
+               buyer_index_file=BUYER_INDEX_FILE, identity_index_file=IDENTITY_INDEX_FILE,
+               risk_zones_file=RISK_ZONES_FILE):
+    keep_columns = DEFAULT_KEEP_COLUMNS if keep_columns is None else keep_columns
+    checkpoint = Checkpoint(output_path, input_path, chunksize)
+    if restart:
+        checkpoint.remove()
+    elif checkpoint.load():
+        print(f"Resuming after chunk {checkpoint.state['chunks_done']} "
+              f"({checkpoint.state['rows_done']} rows)", file=log)
+        # Drop anything a killed run wrote after its last checkpoint
+        if file_format(output_path) == "csv" and os.path.exists(output_path):
+            with open(output_path, "r+b") as f:
+                f.truncate(checkpoint.state["output_bytes"])
+
+    plan = get_rule_plan(metrics_file)
+    buyer_index = get_buyer_index(buyer_index_file)
+    identity_index = get_identity_index(identity_index_file)
+    risk_zones = get_risk_zones(risk_zones_file)
+    started = time.perf_counter()
+    rows_this_run = 0
+    chunks = iter_chunks(input_path, chunksize, keep_columns, checkpoint.state["rows_done"],
+                         checkpoint.state.get("input_offset"))
+    for chunk, input_offset in chunks:
+        inputs = chunk.assign(**history_columns(chunk, buyer_index, identity_index))
+        if "documents_valid" not in inputs.columns:
+            # No documents come with the file, so as on the form they count as not verified
+            inputs["documents_valid"] = False
+        scored = score_transactions(inputs, plan, risk_zones=risk_zones.maybe_reload())
+        kept = chunk[[c for c in keep_columns if c in chunk.columns]]
+        result = pd.concat([kept, scored], axis=1)
+
+        chunk_number = checkpoint.state["chunks_done"] + 1
+        output_bytes = write_chunk(result, output_path, chunk_number, chunk_number == 1)
+        checkpoint.state.update(chunks_done=chunk_number,
+                                rows_done=checkpoint.state["rows_done"] + len(chunk),
+                                output_bytes=output_bytes, input_offset=input_offset)
+        checkpoint.save()
+
+        rows_this_run += len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"chunk {chunk_number}: {checkpoint.state['rows_done']} rows scored, "
+              f"{rows_this_run / elapsed:,.0f} rows/sec", file=log)
+
+    elapsed = time.perf_counter() - started
+    print(f"Done: {checkpoint.state['rows_done']} rows in {checkpoint.state['chunks_done']} chunks; "
+          f"this run scored {rows_this_run} rows in {elapsed:.1f}s "
+          f"({rows_this_run / elapsed if elapsed else 0:,.0f} rows/sec)", file=log)
+    checkpoint.remove()
+    return checkpoint.state["rows_done"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream-score a CSV/Parquet transaction file")
+    parser.add_argument("input", help="CSV file, Parquet file or Parquet directory")
+    parser.add_argument("output", help="CSV file, or Parquet directory (*.parquet or an existing directory)")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Rows per chunk")
+    parser.add_argument("--keep-columns", nargs="*", default=DEFAULT_KEEP_COLUMNS,
+                        help="Input columns copied into the output alongside the check results")
+    parser.add_argument("--metrics-file", default=FRAUD_METRICS_FILE)
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start over")
+    parser.add_argument("--buyer-index", default=BUYER_INDEX_FILE)
+    parser.add_argument("--identity-index", default=IDENTITY_INDEX_FILE)
+    parser.add_argument("--risk-zones", default=RISK_ZONES_FILE)
+    args = parser.parse_args()
+    score_file(args.input, args.output, args.chunksize, args.keep_columns, args.metrics_file, args.restart,
+               buyer_index_file=args.buyer_index, identity_index_file=args.identity_index,
+               risk_zones_file=args.risk_zones)
+
+
+if __name__ == "__main__":
+    main()
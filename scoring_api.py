@@ -0,0 +1,339 @@
+"""Headless HTTP scoring API for the fraud rule checks.
+
+    python scoring_api.py --port 8080
+
+POST /score with one transaction object (or a JSON array of them) using the Fraud
+Check form's field names; the response holds per-check results, the risk score and
+risk band for each. buyer_name, ssn and seller_name are looked up in the buyer and
+identity indexes, and property coordinates in the high-risk zones, as for a check
+from the form; the API only reads the history, it never records to it. Requests
+arriving within the batch window are scored together in one vectorized
+evaluation. GET /health returns the server's counters.
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from buyer_index import get_buyer_index
+from fraud_engine import score_columns
+from geo import distance_km
+from identity_index import get_identity_index
+from risk_zones import get_risk_zones
+from rule_plan import get_rule_plan
+
+REQUIRED_FIELDS = ("property_value", "mortgage_amount", "property_size", "transaction_days")
+COORDINATE_FIELDS = ("location_lat", "location_long", "buyer_lat", "buyer_long")
+IDENTITY_FIELDS = ("buyer_name", "ssn", "seller_name")
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _number(value):
+    """`value` as a finite float, or None if it is not a number"""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def validate_transaction(transaction, index=0):
+    """Copy of a request transaction with its numeric fields coerced to floats.
+
+    Anything that could fail inside a shared micro-batch is rejected here, so a bad
+    transaction gets a 400 without affecting the requests batched with it.
+    """
+    if not isinstance(transaction, dict):
+        raise RequestError(400, f"Transaction {index} is not a JSON object")
+    missing = [field for field in REQUIRED_FIELDS if transaction.get(field) is None]
+    if transaction.get("distance") is None and any(transaction.get(f) is None for f in COORDINATE_FIELDS):
+        missing.append("distance or " + "/".join(COORDINATE_FIELDS))
+    if missing:
+        raise RequestError(400, f"Transaction {index} is missing: {', '.join(missing)}")
+
+    transaction = dict(transaction)
+    invalid = []
+    for field in REQUIRED_FIELDS + COORDINATE_FIELDS + ("distance",):
+        if transaction.get(field) is None:
+            continue
+        number = _number(transaction[field])
+        if number is None:
+            invalid.append(field)
+        else:
+            transaction[field] = number
+    for field, limit in (("location_lat", 90), ("buyer_lat", 90), ("location_long", 180), ("buyer_long", 180)):
+        if field not in invalid and transaction.get(field) is not None and abs(transaction[field]) > limit:
+            invalid.append(field)
+    if invalid:
+        raise RequestError(400, f"Transaction {index} has invalid numeric values for: {', '.join(invalid)}")
+    invalid = [field for field in IDENTITY_FIELDS
+               if transaction.get(field) is not None and not isinstance(transaction[field], (str, int))]
+    if invalid:
+        raise RequestError(400, f"Transaction {index} has non-text values for: {', '.join(invalid)}")
+    return transaction
+
+
+def transactions_to_columns(transactions, plan, buyer_index=None, identity_index=None):
+    """Column arrays for a batch of validated transaction dicts, without pandas.
+
+    With the indexes, each transaction's buyer history and identity collisions are
+    looked up against the saved history alone, not against the rest of the batch.
+    """
+    columns = {
+        field: np.array([t[field] for t in transactions], dtype=np.float64)
+        for field in REQUIRED_FIELDS
+    }
+    distance = np.array([np.nan if t.get("distance") is None else t["distance"] for t in transactions],
+                        dtype=np.float64)
+    missing = np.isnan(distance)
+    if missing.any():
+        pending = [t for t, m in zip(transactions, missing) if m]
+        distance[missing] = distance_km(
+            *(np.array([t[field] for t in pending], dtype=np.float64) for field in COORDINATE_FIELDS),
+            mode="auto", threshold=plan["distance"].threshold,
+        )
+    columns["distance"] = distance
+    columns["documents_valid"] = np.array([bool(t.get("documents_valid")) for t in transactions])
+    # Property coordinates for the location risk check (NaN never falls in a zone)
+    for field in ("location_lat", "location_long"):
+        columns[field] = np.array([np.nan if t.get(field) is None else t[field] for t in transactions],
+                                  dtype=np.float64)
+    if buyer_index is not None:
+        columns["buyer_transaction_count"] = np.array(buyer_index.lookup_many(
+            [(t.get("buyer_name"), t.get("ssn")) for t in transactions], sequential=False
+        ), dtype=np.float64)
+    if identity_index is not None:
+        collisions = identity_index.lookup_many(
+            [(t.get("buyer_name"), t.get("ssn"), t.get("seller_name"), t.get("buyer_lat"), t.get("buyer_long"), False)
+             for t in transactions],
+            sequential=False
+        )
+        columns["identity_collisions"] = np.array([c["collisions"] for c in collisions], dtype=np.float64)
+    return columns
+
+
+def results_to_records(result, plan):
+    """Turn scored result arrays into one response dict per row"""
+    columns = {}
+    for rule in plan.rules.values():
+        if f"{rule.check_id}_passed" in result:
+            columns[rule.check_id] = (rule.threshold, result[f"{rule.check_id}_value"].tolist(), result[f"{rule.check_id}_passed"].tolist())
+    risk_scores = result["risk_score"].tolist()
+    risk_levels = result["risk_level"].tolist()
+
+    records = []
+    for i in range(len(risk_scores)):
+        checks = {}
+        for check_id, (threshold, values, passed) in columns.items():
+            check = {"value": values[i]}
+            if threshold is not None:
+                check["threshold"] = threshold
+            check["passed"] = passed[i]
+            checks[check_id] = check
+        records.append({"checks": checks, "risk_score": risk_scores[i], "risk_level": risk_levels[i]})
+    return records
+
+
+class MicroBatcher:
+    """Collects transactions from concurrent requests and scores them together.
+
+    The first request to arrive opens a batch window of `window` seconds (or until
+    `max_batch` transactions are queued); everything queued by then is scored in a
+    single score_columns call on the worker thread, and each request's future
+    receives its own slice of the results. If that call fails, each request is
+    rescored on its own so only the bad one gets the error.
+    """
+
+    def __init__(self, window=0.002, max_batch=4096, metrics_file=None):
+        self.window = window
+        self.max_batch = max_batch
+        self.metrics_file = metrics_file
+        self.buyer_index = get_buyer_index()
+        self.identity_index = get_identity_index()
+        self.risk_zones = get_risk_zones()
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scoring")
+        self.batches = 0
+        self.transactions = 0
+
+    async def score(self, transactions):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((transactions, future))
+        return await future
+
+    def _score_batch(self, transactions):
+        plan = get_rule_plan(self.metrics_file) if self.metrics_file else get_rule_plan()
+        columns = transactions_to_columns(transactions, plan, self.buyer_index, self.identity_index)
+        return results_to_records(score_columns(columns, plan, risk_zones=self.risk_zones.maybe_reload()), plan)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.window
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            transactions = [t for batch, _ in pending for t in batch]
+            try:
+                records = await loop.run_in_executor(self.executor, self._score_batch, transactions)
+            except Exception:
+                # Rescore each request on its own, so an error reaches only the request that caused it
+                for batch, future in pending:
+                    try:
+                        result = await loop.run_in_executor(self.executor, self._score_batch, batch)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+                self.batches += len(pending)
+                self.transactions += len(transactions)
+                continue
+
+            self.batches += 1
+            self.transactions += len(transactions)
+            start = 0
+            for batch, future in pending:
+                if not future.done():
+                    future.set_result(records[start:start + len(batch)])
+                start += len(batch)
+
+
+class ScoringServer:
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.started = time.time()
+        self.requests = 0
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {"error": "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    status, payload = 200, await self.route(method, path, body)
+                except RequestError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            return {
+                "status": "ok",
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "requests": self.requests,
+                "batches": self.batcher.batches,
+                "transactions": self.batcher.transactions,
+            }
+        if path != "/score":
+            raise RequestError(404, f"Unknown path {path}")
+        if method != "POST":
+            raise RequestError(405, "Use POST /score")
+
+        self.requests += 1
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise RequestError(400, "Request body is not valid JSON")
+        if isinstance(payload, list):
+            transactions = [validate_transaction(t, i) for i, t in enumerate(payload)]
+            if not transactions:
+                return []
+            return await self.batcher.score(transactions)
+        return (await self.batcher.score([validate_transaction(payload)]))[0]
+
+    async def respond(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host="127.0.0.1", port=8080, batch_window_ms=2.0, max_batch=4096, metrics_file=None):
+    batcher = MicroBatcher(batch_window_ms / 1000, max_batch, metrics_file)
+    server = ScoringServer(batcher)
+    batch_task = asyncio.create_task(batcher.run())
+    async with await asyncio.start_server(server.handle_connection, host, port) as http_server:
+        print(f"Scoring API listening on http://{host}:{port}")
+        try:
+            await http_server.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the fraud rule checks over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--batch-window-ms", type=float, default=2.0,
+                        help="How long to wait for more requests before scoring a batch")
+    parser.add_argument("--max-batch", type=int, default=4096,
+                        help="Score immediately once this many transactions are queued")
+    parser.add_argument("--metrics-file", default=None, help="Defaults to fraud_metrics.json")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.batch_window_ms, args.max_batch, args.metrics_file))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
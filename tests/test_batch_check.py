@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from batch_check import BatchCheck
+from buyer_index import BuyerIndex
+from identity_index import IdentityIndex
+from rule_plan import FRAUD_METRICS_FILE, get_rule_plan
+
+METRICS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), FRAUD_METRICS_FILE)
+
+
+def _upload(n):
+    return pd.DataFrame({
+        "transaction_id": [f"t{i}" for i in range(n)],
+        "buyer_name": [f"Buyer {i}" for i in range(n)],
+        "seller_name": ["Seller"] * n,
+        "ssn": ["1234"] * n,
+        "property_value": [20_000_000.0] * n,
+        "mortgage_amount": [10_000_000.0] * n,
+        "property_size": [100.0] * n,
+        "transaction_days": [60.0] * n,
+        "latitude": [6.5] * n,
+        "longitude": [3.4] * n,
+        "buyer_latitude": [6.5] * n,
+        "buyer_longitude": [3.4] * n,
+    })
+
+
+def test_blank_size_or_days_rows_are_skipped(tmp_path):
+    batch = BatchCheck(get_rule_plan(METRICS_PATH), BuyerIndex(str(tmp_path / "buyers.sqlite")),
+                       IdentityIndex(str(tmp_path / "identity.sqlite")))
+    chunk = _upload(4)
+    chunk.loc[1, "property_size"] = np.nan
+    chunk.loc[2, "transaction_days"] = np.nan
+
+    results = batch.check_chunk(chunk)
+
+    assert results["status"].tolist() == ["checked", "skipped: missing or invalid fields",
+                                          "skipped: missing or invalid fields", "checked"]
+    assert results["risk_level"].isna().tolist() == [False, True, True, False]
+    assert batch.rows_skipped == 2
+    assert len(batch.records) == 2
+    for record in batch.records:
+        assert not np.isnan(record["checks"]["transaction_timing"]["value"])
+        assert record["checks"]["price_per_sqm"]["value"] > 0
@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+
+from fraud_engine import score_columns
+from generate_transactions import generate_transactions_vectorized
+from rule_plan import FRAUD_METRICS_FILE, get_rule_plan
+
+METRICS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), FRAUD_METRICS_FILE)
+
+# Largest share of legitimate rows allowed to score High
+MAX_LEGITIMATE_HIGH_RATE = 0.10
+
+
+def test_legitimate_rows_rarely_score_high():
+    df = generate_transactions_vectorized(20_000, seed=1)
+    columns = {name: df[name].to_numpy() for name in [
+        "property_value", "mortgage_amount", "property_size", "transaction_days",
+        "latitude", "longitude", "buyer_latitude", "buyer_longitude",
+    ]}
+    # Scored as score_file scores a generated log: no documents, buyer history from earlier rows
+    columns["documents_valid"] = np.zeros(len(df), dtype=bool)
+    columns["buyer_transaction_count"] = df.groupby(["buyer_name", "ssn"]).cumcount().to_numpy(dtype=np.float64)
+    scored = score_columns(columns, get_rule_plan(METRICS_PATH))
+
+    legitimate = df["fraudulent"].to_numpy() == 0
+    high_rate = (scored["risk_level"][legitimate] == "High").mean()
+    assert high_rate < MAX_LEGITIMATE_HIGH_RATE
+    assert (scored["risk_level"][~legitimate] == "High").mean() > high_rate
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from transaction_store import TransactionStore
+
+
+def _transactions(rng, n):
+    return pd.DataFrame({
+        "transaction_id": np.arange(n),
+        "property_type": rng.choice(["Apartment", "Duplex", "Land"], n),
+        "property_value": rng.uniform(1e6, 1e8, n),
+        "fraudulent": rng.integers(0, 2, n),
+    })
+
+
+@pytest.fixture
+def store(tmp_path):
+    rng = np.random.default_rng(0)
+    store = TransactionStore(str(tmp_path / "store"))
+    parts = []
+    for start in range(0, 900, 300):
+        part = _transactions(rng, 300).assign(transaction_id=lambda df: df["transaction_id"] + start)
+        store.append(part)
+        parts.append(part)
+    return store, pd.concat(parts, ignore_index=True)
+
+
+@pytest.mark.parametrize("filters", [None, [("property_type", "in", ["Apartment", "Land"])],
+                                     [("fraudulent", "==", 1), ("property_value", ">=", 5e7)]])
+@pytest.mark.parametrize("offset, limit", [(0, 50), (270, 60), (880, 50)])
+def test_unsorted_query_pages_in_storage_order(store, filters, offset, limit):
+    store, rows = store
+    expected = rows
+    for name, op, value in filters or []:
+        expected = expected[expected[name].isin(value) if op == "in" else
+                            expected[name] == value if op == "==" else expected[name] >= value]
+    page = store.query(filters, columns=["transaction_id", "property_value"], offset=offset, limit=limit)
+    assert list(page.columns) == ["transaction_id", "property_value"]
+    assert page["transaction_id"].tolist() == expected["transaction_id"].iloc[offset:offset + limit].tolist()
+
+
+def test_sorted_query_matches_full_sort(store):
+    store, rows = store
+    page = store.query([("property_type", "==", "Duplex")], sort_by="property_value", ascending=False,
+                       offset=20, limit=30)
+    expected = rows[rows["property_type"] == "Duplex"].sort_values("property_value", ascending=False)
+    assert page["transaction_id"].tolist() == expected["transaction_id"].iloc[20:50].tolist()
@@ -0,0 +1,154 @@
+"""Per-stage timing spans kept as rolling histograms in process.
+
+    with timings.span("history_write"):
+        save_check_history(checks)
+
+Pure standard library, so it can be imported by the login page without pulling in
+numpy. Each stage keeps its last `window` durations (for p50/p95/p99) plus cumulative
+Prometheus histogram buckets, count and sum. A daemon thread rewrites a
+Prometheus text-format file (timings.prom) whenever new samples arrive, so a
+local scraper (node_exporter's textfile collector, or any HTTP file server) can
+read it without the app serving metrics itself.
+"""
+import bisect
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+TIMINGS_FILE = "timings.prom"
+METRIC_NAME = "fraud_app_stage_duration_seconds"
+
+# Upper bounds (seconds) of the exported histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Samples kept per stage for percentiles
+DEFAULT_WINDOW = 1024
+
+EXPORT_INTERVAL = 5.0
+
+
+class StageHistogram:
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.recent = deque(maxlen=window)
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.recent.append(seconds)
+        self.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentiles(self, quantiles=(50, 95, 99)):
+        """Linearly interpolated percentiles of the recent window (as numpy.percentile)"""
+        if not self.recent:
+            return {q: None for q in quantiles}
+        values = sorted(self.recent)
+        result = {}
+        for q in quantiles:
+            position = (len(values) - 1) * q / 100
+            lower = math.floor(position)
+            upper = min(lower + 1, len(values) - 1)
+            result[q] = values[lower] + (values[upper] - values[lower]) * (position - lower)
+        return result
+
+
+class Timings:
+    def __init__(self, export_path=TIMINGS_FILE, export_interval=EXPORT_INTERVAL, window=DEFAULT_WINDOW):
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._changed = threading.Event()
+        self._exporter = None
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = StageHistogram(self.window)
+            histogram.observe(seconds)
+        self._changed.set()
+
+    @contextmanager
+    def span(self, stage):
+        """Time the enclosed block as one sample of `stage` (recorded even if it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def summary(self):
+        """Stage -> {"count", "p50", "p95", "p99"} with percentiles in milliseconds"""
+        with self._lock:
+            stages = {stage: (h.count, h.percentiles()) for stage, h in self._stages.items()}
+        return {
+            stage: {"count": count, **{f"p{q}": v * 1000 if v is not None else None for q, v in p.items()}}
+            for stage, (count, p) in sorted(stages.items())
+        }
+
+    def prometheus_text(self):
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each app stage.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            stages = [(stage, list(h.bucket_counts), h.count, h.total) for stage, h in sorted(self._stages.items())]
+        for stage, bucket_counts, count, total in stages:
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ("+Inf",), bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path=None):
+        """Atomically write the Prometheus text file, so a scraper never reads half of it"""
+        path = path or self.export_path
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _export_loop(self):
+        while True:
+            self._changed.wait()
+            self._changed.clear()
+            try:
+                self.export()
+            except OSError:
+                pass  # best effort; the next sample retries
+            time.sleep(self.export_interval)
+
+    def start_exporter(self):
+        with self._lock:
+            if self._exporter is None:
+                self._exporter = threading.Thread(target=self._export_loop, name="timings-export", daemon=True)
+                self._exporter.start()
+
+
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def get_timings(export_path=TIMINGS_FILE):
+    """Process-wide timings shared by every session, with the file exporter running"""
+    with _timings_lock:
+        if export_path not in _timings:
+            _timings[export_path] = Timings(export_path)
+            _timings[export_path].start_exporter()
+        return _timings[export_path]
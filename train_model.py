@@ -0,0 +1,292 @@
+"""Train the fraud model from transaction files, out of core and reproducibly.
+
+    python train_model.py transactions/                    # directory of CSV/Parquet parts
+    python train_model.py transactions_log.csv --folds 5 --publish
+
+Transactions are streamed in chunks. Each chunk's features are built column by
+column, with the buyer/property distance from geo.haversine_km. Categories get
+codes as they are first seen. The chunk is then appended to an on-disk float32
+feature matrix, so peak memory does not grow with the input size. After the last
+chunk, the category codes are renumbered to the sorted order a fitted
+LabelEncoder uses.
+
+LightGBM bins the memory-mapped matrix once into a Dataset. Cross-validation folds
+are subsets of that binned Dataset and train in parallel threads. Class imbalance
+is handled with `scale_pos_weight` instead of SMOTE oversampling, which would
+have to hold synthetic rows in memory. The final model is trained on every row
+for the mean best iteration.
+
+Artifacts are written to models/vNNNNNN/: the model and encoders (in the format
+model_service loads), the binned dataset, and report.json with the stage
+timings, peak memory, CV scores, parameters and input fingerprint. --publish
+also copies the model and encoders to the paths the app loads.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+from sklearn.preprocessing import LabelEncoder
+
+from geo import haversine_km
+from model_service import ENCODERS_FILE, FEATURE_ALIASES, MODEL_FILE
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not reported
+    resource = None
+
+MODELS_DIR = "models"
+LABEL_COLUMN = "fraudulent"
+
+NUMERIC_FEATURES = [
+    "property_value", "mortgage_amount", "property_size",
+    "latitude", "longitude", "buyer_latitude", "buyer_longitude",
+    "distance", "transaction_month", "transaction_days",
+]
+CATEGORICAL_FEATURES = ["property_type", "buyer_gender"]
+
+DEFAULT_PARAMS = {
+    "objective": "binary",
+    "metric": "auc",
+    "learning_rate": 0.05,
+    "num_leaves": 63,
+    "min_data_in_leaf": 100,
+    "feature_fraction": 0.9,
+    "bagging_fraction": 0.8,
+    "bagging_freq": 1,
+    "max_bin": 255,
+    "deterministic": True,
+    "force_row_wise": True,
+    "verbosity": -1,
+}
+
+
+def _peak_memory_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _input_files(path):
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.endswith((".csv", ".parquet"))
+        )
+    return [path]
+
+
+def iter_chunks(path, chunk_rows=1_000_000):
+    """DataFrames of at most `chunk_rows` rows from a CSV/Parquet file or a directory of them"""
+    for file_path in _input_files(path):
+        if file_path.endswith(".parquet"):
+            for batch in ds.dataset(file_path, format="parquet").to_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(file_path, chunksize=chunk_rows)
+
+
+def _fingerprint(path):
+    """Identity of the input files (names, sizes, mtimes) recorded with the model"""
+    digest = hashlib.sha256()
+    for file_path in _input_files(path):
+        stat = os.stat(file_path)
+        digest.update(f"{os.path.basename(file_path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+class FeatureWriter:
+    """Appends feature chunks to a raw float32 file and encodes categories incrementally"""
+
+    def __init__(self, directory, feature_names, categorical):
+        self.feature_names = feature_names
+        self.categorical = categorical
+        self.categories = {column: {} for column in categorical}  # value -> first-seen code
+        self.rows = 0
+        self.positives = 0
+        self.features_path = os.path.join(directory, "features.f32")
+        self.labels_path = os.path.join(directory, "labels.f32")
+        self._features = open(self.features_path, "wb")
+        self._labels = open(self.labels_path, "wb")
+
+    def _encode(self, column, values):
+        seen = self.categories[column]
+        uniques, inverse = np.unique(values.astype(str), return_inverse=True)
+        codes = np.array([seen.setdefault(value, len(seen)) for value in uniques.tolist()], dtype=np.float32)
+        return codes[inverse]
+
+    def write(self, df):
+        df = df.rename(columns={k: v for k, v in FEATURE_ALIASES.items() if v not in df.columns})
+        if "distance" in self.feature_names and "distance" not in df.columns:
+            df = df.assign(distance=haversine_km(
+                df["latitude"].to_numpy(np.float64), df["longitude"].to_numpy(np.float64),
+                df["buyer_latitude"].to_numpy(np.float64), df["buyer_longitude"].to_numpy(np.float64),
+            ))
+        features = np.empty((len(df), len(self.feature_names)), dtype=np.float32)
+        for i, name in enumerate(self.feature_names):
+            if name in self.categories:
+                features[:, i] = self._encode(name, df[name].to_numpy())
+            else:
+                features[:, i] = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float32)
+        labels = df[LABEL_COLUMN].to_numpy(dtype=np.float32)
+        self._features.write(features.tobytes())
+        self._labels.write(labels.tobytes())
+        self.rows += len(df)
+        self.positives += int(labels.sum())
+
+    def finish(self):
+        """Close the files; returns (features memmap, labels memmap, fitted LabelEncoders)"""
+        self._features.close()
+        self._labels.close()
+        features = np.memmap(self.features_path, dtype=np.float32, mode="r+",
+                             shape=(self.rows, len(self.feature_names)))
+        labels = np.memmap(self.labels_path, dtype=np.float32, mode="r", shape=(self.rows,))
+
+        # Renumber first-seen codes into LabelEncoder's sorted-class order
+        encoders = {}
+        for column, seen in self.categories.items():
+            classes = np.array(sorted(seen))
+            remap = np.empty(len(seen), dtype=np.float32)
+            remap[[seen[value] for value in classes.tolist()]] = np.arange(len(classes), dtype=np.float32)
+            i = self.feature_names.index(column)
+            for start in range(0, self.rows, 1_000_000):
+                block = features[start:start + 1_000_000, i]
+                features[start:start + 1_000_000, i] = remap[block.astype(np.int64)]
+            encoder = LabelEncoder()
+            encoder.classes_ = classes
+            encoders[column] = encoder
+        features.flush()
+        return features, labels, encoders
+
+
+def _train_fold(train_set, fold, fold_ids, params, num_rounds, early_stopping):
+    """Train on every fold but `fold`; early-stop and score on `fold`"""
+    fold_train = train_set.subset(np.flatnonzero(fold_ids != fold))
+    fold_valid = train_set.subset(np.flatnonzero(fold_ids == fold))
+    booster = lgb.train(
+        params, fold_train, num_boost_round=num_rounds, valid_sets=[fold_valid],
+        callbacks=[lgb.early_stopping(early_stopping, verbose=False)],
+    )
+    auc = booster.best_score["valid_0"]["auc"]
+    return {"fold": fold, "best_iteration": booster.best_iteration, "auc": round(float(auc), 6)}
+
+
+def _next_version(directory):
+    versions = [int(name[1:]) for name in os.listdir(directory) if name.startswith("v") and name[1:].isdigit()]
+    return max(versions, default=0) + 1
+
+
+def train(data_path, models_dir=MODELS_DIR, folds=5, num_rounds=2000, early_stopping=50,
+          chunk_rows=1_000_000, seed=42, threads=None, params=None, publish=False):
+    threads = threads or os.cpu_count() or 1
+    timings = {}
+    started = time.perf_counter()
+    os.makedirs(models_dir, exist_ok=True)
+    version = _next_version(models_dir)
+    output_dir = os.path.join(models_dir, f"v{version:06d}")
+    os.makedirs(output_dir)
+    work_dir = tempfile.mkdtemp(prefix="train-", dir=output_dir)
+
+    try:
+        # Stream the input into an on-disk feature matrix
+        stage = time.perf_counter()
+        first = next(iter_chunks(data_path, chunk_rows=1))
+        first = first.rename(columns={k: v for k, v in FEATURE_ALIASES.items() if v not in first.columns})
+        available = set(first.columns) | ({"distance"} if {"latitude", "longitude", "buyer_latitude",
+                                                            "buyer_longitude"} <= set(first.columns) else set())
+        feature_names = [name for name in CATEGORICAL_FEATURES + NUMERIC_FEATURES if name in available]
+        categorical = [name for name in CATEGORICAL_FEATURES if name in available]
+        writer = FeatureWriter(work_dir, feature_names, categorical)
+        for chunk in iter_chunks(data_path, chunk_rows):
+            writer.write(chunk)
+        features, labels, encoders = writer.finish()
+        timings["load_features"] = time.perf_counter() - stage
+
+        # Bin once; CV folds and the final model reuse the binned data
+        stage = time.perf_counter()
+        params = dict(DEFAULT_PARAMS, **(params or {}))
+        params.update(seed=seed, num_threads=threads,
+                      scale_pos_weight=(writer.rows - writer.positives) / max(writer.positives, 1))
+        train_set = lgb.Dataset(features, label=labels, feature_name=feature_names,
+                                categorical_feature=categorical, params=params, free_raw_data=False)
+        train_set.construct()
+        train_set.save_binary(os.path.join(output_dir, "dataset.bin"))
+        timings["bin_dataset"] = time.perf_counter() - stage
+
+        # Cross-validation folds in parallel, splitting the cores between them
+        stage = time.perf_counter()
+        fold_ids = np.random.default_rng(seed).integers(0, folds, writer.rows)
+        fold_params = dict(params, num_threads=max(1, threads // folds))
+        with ThreadPoolExecutor(max_workers=min(folds, threads)) as pool:
+            cv_results = list(pool.map(
+                lambda fold: _train_fold(train_set, fold, fold_ids, fold_params, num_rounds, early_stopping),
+                range(folds),
+            ))
+        best_iteration = max(1, int(round(np.mean([r["best_iteration"] for r in cv_results]))))
+        timings["cross_validation"] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        booster = lgb.train(params, train_set, num_boost_round=best_iteration)
+        timings["final_model"] = time.perf_counter() - stage
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    model_path = os.path.join(output_dir, os.path.basename(MODEL_FILE))
+    encoders_path = os.path.join(output_dir, os.path.basename(ENCODERS_FILE))
+    joblib.dump(booster, model_path)
+    joblib.dump(encoders, encoders_path)
+    if publish:
+        shutil.copyfile(model_path, MODEL_FILE)
+        shutil.copyfile(encoders_path, ENCODERS_FILE)
+
+    report = {
+        "version": version,
+        "created": datetime.now().isoformat(),
+        "data": os.path.abspath(data_path),
+        "data_fingerprint": _fingerprint(data_path),
+        "rows": writer.rows,
+        "fraud_rows": writer.positives,
+        "features": feature_names,
+        "categorical_features": categorical,
+        "params": params,
+        "folds": cv_results,
+        "cv_auc_mean": round(float(np.mean([r["auc"] for r in cv_results])), 6),
+        "best_iteration": best_iteration,
+        "timings_seconds": {name: round(seconds, 2) for name, seconds in timings.items()},
+        "total_seconds": round(time.perf_counter() - started, 2),
+        "peak_memory_mb": _peak_memory_mb(),
+        "published": publish,
+    }
+    with open(os.path.join(output_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the fraud model from CSV/Parquet transactions")
+    parser.add_argument("data", help="CSV/Parquet file or a directory of part files")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=2000, help="Maximum boosting rounds")
+    parser.add_argument("--early-stopping", type=int, default=50)
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=None, help="Defaults to all cores")
+    parser.add_argument("--publish", action="store_true", help=f"Also copy the artifacts to {MODEL_FILE} / {ENCODERS_FILE}")
+    args = parser.parse_args()
+    result = train(args.data, args.models_dir, args.folds, args.rounds, args.early_stopping,
+                   args.chunk_rows, args.seed, args.threads, publish=args.publish)
+    print(f"v{result['version']:06d}: {result['rows']} rows, CV AUC {result['cv_auc_mean']}, "
+          f"{result['total_seconds']}s, peak memory {result['peak_memory_mb']} MB")
@@ -0,0 +1,373 @@
+import csv
+import io
+import json
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from locks import file_lock
+
+TRANSACTIONS_CSV = "transactions_log.csv"
+TRANSACTION_STORE_DIR = "transaction_store"
+AGGREGATES_FILE = "aggregates.json"
+PART_PREFIX = "part-"
+LOCK_FILE = ".lock"
+
+# Older logs call the month column "month", generate_transactions.py "transaction_month"
+MONTH_COLUMNS = ("month", "transaction_month")
+
+# Incremental ingests write small parts; once this many parts under COMPACT_PART_ROWS
+# rows pile up, they are rewritten as one part
+COMPACT_MIN_PARTS = 8
+COMPACT_PART_ROWS = 250_000
+
+
+class _BoundedReader(io.RawIOBase):
+    """Read-only view of a binary file that stops at `end`"""
+
+    def __init__(self, f, end):
+        self._f = f
+        self._end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self._end - self._f.tell()
+        if remaining <= 0:
+            return 0
+        data = self._f.read(min(len(buffer), remaining))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _last_line_end(f, start, end, block_size=64 * 1024):
+    """Offset just past the last newline in [start, end), or `start` if there is none"""
+    position = end
+    while position > start:
+        step = min(block_size, position - start)
+        position -= step
+        f.seek(position)
+        newline = f.read(step).rfind(b"\n")
+        if newline >= 0:
+            return position + newline + 1
+    return start
+
+
+def _empty_aggregates():
+    return {
+        "total": 0,
+        "fraud": 0,
+        # key -> [transactions, fraud cases]
+        "by_property_type": {},
+        "by_month": {},
+        "source": None,
+        "parts": 0,
+    }
+
+
+class TransactionStore:
+    """Parquet-backed copy of the transaction log with incrementally maintained aggregates.
+
+    Rows are appended as Parquet part files, and every append folds the new rows'
+    per-property-type and per-month counts into `aggregates.json`, so dashboard
+    summaries never touch the rows themselves.
+    """
+
+    def __init__(self, directory=TRANSACTION_STORE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._aggregates = None
+        self._aggregates_mtime = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def aggregates_path(self):
+        return os.path.join(self.directory, AGGREGATES_FILE)
+
+    # Aggregates
+
+    def _load_aggregates(self):
+        """In-memory aggregates, re-read only when another process has changed them"""
+        try:
+            mtime = os.stat(self.aggregates_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._aggregates is None or mtime != self._aggregates_mtime:
+            if mtime is None:
+                self._aggregates = _empty_aggregates()
+            else:
+                with open(self.aggregates_path, "r") as f:
+                    self._aggregates = json.load(f)
+            self._aggregates_mtime = mtime
+        return self._aggregates
+
+    def _save_aggregates(self, aggregates):
+        tmp_path = self.aggregates_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(aggregates, f)
+        os.replace(tmp_path, self.aggregates_path)
+        self._aggregates = aggregates
+        self._aggregates_mtime = os.stat(self.aggregates_path).st_mtime_ns
+
+    @staticmethod
+    def _fold(aggregates, df):
+        fraud = df["fraudulent"].astype(int)
+        aggregates["total"] += len(df)
+        aggregates["fraud"] += int(fraud.sum())
+
+        by_type = fraud.groupby(df["property_type"].astype(str)).agg(["count", "sum"])
+        for key, (count, fraud_sum) in by_type.iterrows():
+            counts = aggregates["by_property_type"].setdefault(key, [0, 0])
+            counts[0] += int(count)
+            counts[1] += int(fraud_sum)
+
+        month_column = next((c for c in MONTH_COLUMNS if c in df.columns), None)
+        if month_column is not None:
+            by_month = fraud.groupby(df[month_column].astype(int)).agg(["count", "sum"])
+            for key, (count, fraud_sum) in by_month.iterrows():
+                counts = aggregates["by_month"].setdefault(str(key), [0, 0])
+                counts[0] += int(count)
+                counts[1] += int(fraud_sum)
+
+    # Writing
+
+    def _part_path(self, number):
+        return os.path.join(self.directory, f"{PART_PREFIX}{number:06d}.parquet")
+
+    def _append_locked(self, df, aggregates):
+        if len(df) == 0:
+            return
+        aggregates["parts"] += 1
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), self._part_path(aggregates["parts"]))
+        self._fold(aggregates, df)
+
+    def append(self, df):
+        """Append new transactions and update the aggregates with just those rows"""
+        with self._lock, file_lock(os.path.join(self.directory, LOCK_FILE)):
+            self._aggregates = None
+            aggregates = self._load_aggregates()
+            self._append_locked(df, aggregates)
+            self._save_aggregates(aggregates)
+
+    def _compact_locked(self, aggregates):
+        """Rewrite the small parts as one part once enough of them have piled up"""
+        small = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith(PART_PREFIX):
+                path = os.path.join(self.directory, name)
+                if pq.ParquetFile(path).metadata.num_rows < COMPACT_PART_ROWS:
+                    small.append(path)
+        if len(small) < COMPACT_MIN_PARTS:
+            return
+        # CSV chunks can infer different types for a column (int vs float with gaps)
+        table = pa.concat_tables([pq.read_table(path) for path in small], promote_options="permissive")
+        aggregates["parts"] += 1
+        part_path = self._part_path(aggregates["parts"])
+        # Written under a hidden name first, so readers never see half a part
+        tmp_path = os.path.join(self.directory, "." + os.path.basename(part_path))
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, part_path)
+        for path in small:
+            os.remove(path)
+
+    def clear(self):
+        with self._lock, file_lock(os.path.join(self.directory, LOCK_FILE)):
+            for name in os.listdir(self.directory):
+                if name.startswith(PART_PREFIX):
+                    os.remove(os.path.join(self.directory, name))
+            self._save_aggregates(_empty_aggregates())
+
+    def ingest_csv(self, csv_path=TRANSACTIONS_CSV, chunksize=500_000):
+        """Bring the store up to date with a CSV transaction log.
+
+        Only bytes appended to the CSV since the last ingest are parsed; a CSV that
+        was rewritten (shrunk or replaced) is re-ingested from scratch. Returns the
+        number of new rows. A partially written last line is left for the next ingest.
+        """
+        stat = os.stat(csv_path)
+        with self._lock, file_lock(os.path.join(self.directory, LOCK_FILE)):
+            self._aggregates = None
+            aggregates = self._load_aggregates()
+            source = aggregates["source"]
+            if source and source["path"] == os.path.abspath(csv_path) and \
+                    source["size"] == stat.st_size and source["mtime"] == stat.st_mtime_ns:
+                return 0
+
+            if not source or source["path"] != os.path.abspath(csv_path) or source["size"] > stat.st_size:
+                for name in os.listdir(self.directory):
+                    if name.startswith(PART_PREFIX):
+                        os.remove(os.path.join(self.directory, name))
+                aggregates = _empty_aggregates()
+                offset, header = 0, None
+            else:
+                offset, header = source["offset"], source["header"]
+
+            new_rows = 0
+            with open(csv_path, "rb") as f:
+                if header is None:
+                    header_line = f.readline()
+                    # A header still being written is read again by the next ingest
+                    if header_line.endswith(b"\n"):
+                        header = next(csv.reader([header_line.decode("utf-8-sig")]))
+                        offset = f.tell()
+                # Stop at the last complete line; the next ingest starts from there
+                end = _last_line_end(f, offset, stat.st_size) if header is not None else offset
+                f.seek(offset)
+                if end > offset:
+                    reader = io.BufferedReader(_BoundedReader(f, end))
+                    for chunk in pd.read_csv(reader, names=header, header=None, chunksize=chunksize):
+                        self._append_locked(chunk, aggregates)
+                        new_rows += len(chunk)
+                offset = end
+            self._compact_locked(aggregates)
+
+            aggregates["source"] = {
+                "path": os.path.abspath(csv_path),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "offset": offset,
+                "header": header,
+            }
+            self._save_aggregates(aggregates)
+            return new_rows
+
+    # Reading
+
+    def summary(self):
+        with self._lock:
+            aggregates = self._load_aggregates()
+        total, fraud = aggregates["total"], aggregates["fraud"]
+        return {
+            "total_transactions": total,
+            "fraud_transactions": fraud,
+            "fraud_rate": (fraud / total) * 100 if total else 0.0,
+        }
+
+    def property_type_summary(self):
+        """Per-property-type fraud cases, totals and fraud rate, from the counters"""
+        with self._lock:
+            counts = self._load_aggregates()["by_property_type"]
+        summary_df = pd.DataFrame(
+            [(key, fraud, total) for key, (total, fraud) in sorted(counts.items())],
+            columns=["property_type", "Fraud Cases", "Total Transactions"],
+        ).set_index("property_type")
+        summary_df["Fraud Rate (%)"] = (
+            summary_df["Fraud Cases"] / summary_df["Total Transactions"] * 100
+        ).round(2)
+        return summary_df.fillna(0)
+
+    def monthly_fraud_counts(self):
+        """Fraud cases per month number (1-12), from the counters"""
+        with self._lock:
+            counts = self._load_aggregates()["by_month"]
+        return pd.Series(
+            {int(month): fraud for month, (_, fraud) in counts.items()}, dtype="int64"
+        ).sort_index()
+
+    def version(self):
+        """Changes whenever the stored rows (and so every aggregate) change"""
+        with self._lock:
+            self._load_aggregates()
+            return self._aggregates_mtime
+
+    def has_month_data(self):
+        with self._lock:
+            return bool(self._load_aggregates()["by_month"])
+
+    def dataset(self):
+        return ds.dataset(self.directory, format="parquet", exclude_invalid_files=True,
+                          ignore_prefixes=[".", "_", AGGREGATES_FILE])
+
+    def column_names(self):
+        return self.dataset().schema.names
+
+    @staticmethod
+    def _filter_expression(filters):
+        """pyarrow [(column, op, value), ...] filters as a dataset expression (None for no filter)"""
+        return pq.filters_to_expression(filters) if filters else None
+
+    def filtered_summary(self, filters=None):
+        """Row count and fraud cases of the rows matching `filters`.
+
+        Without filters this is the precomputed summary; otherwise only the
+        `fraudulent` column of the matching row groups is read.
+        """
+        if not filters:
+            summary = self.summary()
+            return {"transactions": summary["total_transactions"], "fraud_cases": summary["fraud_transactions"]}
+        table = self.dataset().to_table(columns=["fraudulent"], filter=self._filter_expression(filters))
+        fraud = pc.sum(table["fraudulent"].cast(pa.int64())).as_py() or 0
+        return {"transactions": table.num_rows, "fraud_cases": fraud}
+
+    def query(self, filters=None, columns=None, sort_by=None, ascending=True, offset=0, limit=50):
+        """One page of rows matching `filters`, as a DataFrame.
+
+        The filter is pushed down to the Parquet scan (row groups whose statistics
+        cannot match are skipped). Unsorted pages read only `columns` and stop
+        scanning once the page is filled. Sorted pages first scan only the sort and
+        filter columns, keeping the top `offset + limit` (row group, row) positions as
+        they go, then read `columns` from just the row groups holding the page.
+        """
+        dataset = self.dataset()
+        columns = list(columns or dataset.schema.names)
+        expression = self._filter_expression(filters)
+
+        if sort_by is None:
+            batches, seen = [], 0
+            for batch in dataset.to_batches(columns=columns, filter=expression):
+                if seen + batch.num_rows > offset:
+                    start = max(0, offset - seen)
+                    batches.append(batch.slice(start, offset + limit - seen - start))
+                seen += batch.num_rows
+                if seen >= offset + limit:
+                    break
+            schema = pa.schema([dataset.schema.field(name) for name in columns])
+            return pa.Table.from_batches(batches, schema=schema).to_pandas()
+
+        sort_keys = [(sort_by, "ascending" if ascending else "descending")]
+        key_columns = list(dict.fromkeys([sort_by] + [name for name, _, _ in filters or []]))
+        row_groups, top = [], None
+        for fragment in dataset.get_fragments(filter=expression):
+            for row_group in fragment.split_by_row_group(expression, schema=dataset.schema):
+                keys = row_group.to_table(columns=key_columns, schema=dataset.schema)
+                keys = keys.append_column("_row_group", pa.array([len(row_groups)] * keys.num_rows, pa.int64()))
+                keys = keys.append_column("_row", pa.array(range(keys.num_rows), pa.int64()))
+                row_groups.append(row_group)
+                if expression is not None:
+                    keys = keys.filter(expression)
+                keys = keys.select([sort_by, "_row_group", "_row"])
+                top = keys if top is None else pa.concat_tables([top, keys])
+                if top.num_rows > offset + limit:
+                    top = top.take(pc.select_k_unstable(top, offset + limit, sort_keys))
+        page = []
+        if top is not None:
+            top = top.take(pc.sort_indices(top, sort_keys)).slice(offset, limit)
+            page = list(zip(top["_row_group"].to_pylist(), top["_row"].to_pylist()))
+        if not page:
+            return pa.schema([dataset.schema.field(name) for name in columns]).empty_table().to_pandas()
+
+        # Read the page's rows, one row group at a time, then put them in sort order
+        parts, positions = [], {}
+        for index in sorted({row_group for row_group, _ in page}):
+            rows = sorted(row for row_group, row in page if row_group == index)
+            parts.append(row_groups[index].to_table(columns=columns, schema=dataset.schema).take(rows))
+            positions.update(((index, row), len(positions)) for row in rows)
+        return pa.concat_tables(parts).take([positions[key] for key in page]).to_pandas()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_transaction_store(directory=TRANSACTION_STORE_DIR):
+    """Process-wide store instance, shared across Streamlit sessions and reruns"""
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = TransactionStore(directory)
+        return _stores[directory]
@@ -0,0 +1,116 @@
+"""Login accounts kept in users.json, cached in process.
+
+Reads are served from an in-memory copy that is reloaded only when the file's
+mtime/size change, so logins and admin page renders do no file I/O beyond a
+stat. Writes re-read the file under a cross-process lock, apply the change and
+replace the file atomically (temp file + rename), so signups from concurrent
+sessions or processes never overwrite each other.
+"""
+import json
+import os
+import tempfile
+import threading
+
+from locks import file_lock
+
+USERS_FILE = "users.json"
+
+DEFAULT_USERS = {"admin": {"password": "admin123", "role": "admin"}}
+
+
+class UserStore:
+    def __init__(self, path=USERS_FILE):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._lock = threading.Lock()
+        self._users = None
+        self._usernames = []  # sorted, for paging
+        self._version = None
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read_file(self):
+        if not os.path.exists(self.path):
+            return dict(DEFAULT_USERS)
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def _set(self, users, version):
+        self._users = users
+        self._usernames = sorted(users)
+        self._version = version
+
+    def _current(self):
+        """Cached users, reloaded only if the file changed since the last read"""
+        version = self._file_version()
+        with self._lock:
+            if self._users is None or version != self._version:
+                self._set(self._read_file(), version)
+            return self._users
+
+    def get(self, username):
+        user = self._current().get(username)
+        return dict(user) if user else None
+
+    def authenticate(self, username, password):
+        """The user's record if the password matches, else None"""
+        user = self.get(username)
+        if user is not None and user["password"] == password:
+            return user
+        return None
+
+    def __contains__(self, username):
+        return username in self._current()
+
+    def __len__(self):
+        return len(self._current())
+
+    def page(self, offset=0, limit=50):
+        """(username, role) pairs for one page of users, ordered by username"""
+        self._current()
+        with self._lock:
+            users, usernames = self._users, self._usernames
+        return [(username, users[username]["role"]) for username in usernames[offset:offset + limit]]
+
+    def add(self, username, password, role="user", overwrite=False):
+        """Create (or with overwrite, replace) a user; False if the username is taken"""
+        with file_lock(self.lock_path):
+            users = self._read_file()
+            if username in users and not overwrite:
+                with self._lock:
+                    self._set(users, self._file_version())
+                return False
+            users[username] = {"password": password, "role": role}
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(users, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            with self._lock:
+                self._set(users, self._file_version())
+        return True
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_user_store(path=USERS_FILE):
+    """Process-wide store shared by every Streamlit session"""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = UserStore(path)
+        return _stores[path]
@@ -0,0 +1,176 @@
+"""What-if threshold tuning over the stored check history.
+
+For each threshold check, the history's values are sorted once. Every row also
+gets two precomputed risk bands: one for when that check passes and one for when
+it fails, with the other checks held at their current thresholds. Rows that fail
+under a candidate threshold form a contiguous run of the sorted array, so one
+binary search gives:
+
+- how many transactions flip between pass and fail, and
+- the High/Medium/Low counts under the new threshold.
+
+The band counts come from block prefix sums of the sorted band codes. A slider
+move therefore costs a binary search plus one partial block, however large the
+history is. Moving several sliders at once is answered by a vectorized pass over
+the stored values (`combined_bands`). So is moving the property value threshold:
+it also moves the buyer history exemption, which changes the other check's
+verdicts too.
+"""
+import threading
+
+import numpy as np
+
+from check_history import CHECKS_HISTORY_DIR, CheckHistoryLog
+from rescoring import RESCORING_DIR, read_input_columns, refresh_inputs
+from rule_plan import CHECK_DEFINITIONS, RISK_BANDS
+
+BANDS = [band for _, band in RISK_BANDS]
+
+# Rows per prefix-sum block
+BLOCK_SIZE = 1024
+
+
+def _band_codes(scores):
+    """Index into BANDS for each risk score"""
+    return np.select([scores >= minimum for minimum, _ in RISK_BANDS], list(range(len(BANDS))), default=len(BANDS) - 1)
+
+
+class _SortedCheck:
+    def __init__(self, comparator, values, weight, base_scores):
+        order = np.argsort(values, kind="stable")
+        self.comparator = comparator
+        self.values = values[order]
+        self.pass_codes = _band_codes(base_scores[order]).astype(np.int8)
+        self.fail_codes = _band_codes(base_scores[order] + weight).astype(np.int8)
+        self.pass_blocks = self._block_counts(self.pass_codes)
+        self.fail_blocks = self._block_counts(self.fail_codes)
+
+    @staticmethod
+    def _block_counts(codes):
+        """Band counts of codes[:i * BLOCK_SIZE] for every block boundary i"""
+        blocks = np.zeros((len(codes) // BLOCK_SIZE + 1, len(BANDS)), dtype=np.int64)
+        for code in range(len(BANDS)):
+            hits = (codes == code)[:len(codes) // BLOCK_SIZE * BLOCK_SIZE].reshape(-1, BLOCK_SIZE).sum(axis=1)
+            blocks[1:, code] = np.cumsum(hits)
+        return blocks
+
+    @staticmethod
+    def _prefix(codes, blocks, k):
+        block = k // BLOCK_SIZE
+        return blocks[block] + np.bincount(codes[block * BLOCK_SIZE:k], minlength=len(BANDS))
+
+    def failing_range(self, threshold):
+        """(start, stop) of the sorted rows that fail at `threshold`"""
+        if self.comparator == "le":  # fails when value > threshold
+            return int(np.searchsorted(self.values, threshold, side="right")), len(self.values)
+        return 0, int(np.searchsorted(self.values, threshold, side="left"))  # ge: fails when value < threshold
+
+    def band_counts(self, threshold):
+        start, stop = self.failing_range(threshold)
+        n = len(self.values)
+        passing = lambda a, b: self._prefix(self.pass_codes, self.pass_blocks, b) - self._prefix(self.pass_codes, self.pass_blocks, a)
+        failing = self._prefix(self.fail_codes, self.fail_blocks, stop) - self._prefix(self.fail_codes, self.fail_blocks, start)
+        return passing(0, start) + passing(stop, n) + failing
+
+
+class ThresholdWhatIf:
+    """Sorted per-check value arrays for answering threshold what-ifs.
+
+    `columns` maps rule input columns to value arrays, as from
+    rescoring.read_input_columns.
+    """
+
+    def __init__(self, columns, plan):
+        self.plan = plan
+        self.columns = columns
+        self.size = len(next(iter(columns.values()))) if columns else 0
+        self.failing = {}
+        scores = np.zeros(self.size, dtype=np.int64)
+        for check_id, rule in plan.rules.items():
+            if rule.column in columns:
+                self.failing[check_id] = ~np.asarray(rule.comparator(self._values(check_id), rule.threshold), dtype=bool)
+                scores += np.where(self.failing[check_id], rule.weight, 0)
+        self.scores = scores
+
+        self.checks = {}
+        for check_id, (_, column, comparator) in CHECK_DEFINITIONS.items():
+            rule = plan[check_id]
+            if comparator in ("le", "ge") and check_id in self.failing and rule.threshold is not None:
+                base_scores = scores - np.where(self.failing[check_id], rule.weight, 0)
+                self.checks[check_id] = _SortedCheck(comparator, self._values(check_id), rule.weight, base_scores)
+
+    def _values(self, check_id, property_threshold=None):
+        """Values of a check's input, placed so sorting puts failing rows on the failing side.
+
+        `property_threshold` is the property value threshold that sets the buyer
+        history exemption (default: the current one).
+        """
+        values = np.asarray(self.columns[self.plan[check_id].column], dtype=np.float64)
+        # A missing value fails either comparison. NaN sorts last, which is only the
+        # failing end for "le" checks, so "ge" checks move it to the low end
+        if CHECK_DEFINITIONS[check_id][2] == "ge":
+            values = np.where(np.isnan(values), -np.inf, values)
+        # Buyers of low-value properties are exempt from the history check: never failing
+        if check_id == "buyer_history" and "property_value" in self.columns:
+            if property_threshold is None:
+                property_threshold = self.plan["property_value"].threshold
+            exempt = np.asarray(self.columns["property_value"]) <= property_threshold
+            values = np.where(exempt, np.inf, values)
+        return values
+
+    def value_range(self, check_id):
+        values = self.checks[check_id].values
+        finite = values[np.isfinite(values)]
+        return (float(finite[0]), float(finite[-1])) if finite.size else (0.0, 0.0)
+
+    def current_bands(self):
+        return dict(zip(BANDS, np.bincount(_band_codes(self.scores), minlength=len(BANDS)).tolist()))
+
+    def impact(self, check_id, threshold):
+        """Effect of moving one check's threshold, others held at their current values"""
+        check = self.checks[check_id]
+        current_start, current_stop = check.failing_range(self.plan[check_id].threshold)
+        start, stop = check.failing_range(threshold)
+        if check_id == "property_value" and "buyer_history" in self.failing:
+            # The buyer history exemption moves with this threshold, so other rows change band too
+            bands = self.combined_bands({check_id: threshold})
+        else:
+            bands = dict(zip(BANDS, check.band_counts(threshold).tolist()))
+        return {
+            "failing": stop - start,
+            "flips": abs(start - current_start) + abs(stop - current_stop),
+            "bands": bands,
+        }
+
+    def combined_bands(self, thresholds):
+        """Band counts with several thresholds changed at once (one vectorized pass per changed check)"""
+        scores = self.scores.copy()
+        changed = {c: t for c, t in thresholds.items() if c in self.checks and t != self.plan[c].threshold}
+        property_threshold = changed.get("property_value", self.plan["property_value"].threshold)
+        if "property_value" in changed and "buyer_history" in self.failing:
+            changed.setdefault("buyer_history", self.plan["buyer_history"].threshold)
+        for check_id, threshold in changed.items():
+            rule = self.plan[check_id]
+            values = self._values(check_id, property_threshold)
+            failing = ~np.asarray(rule.comparator(values, threshold), dtype=bool)
+            scores += (failing.astype(np.int64) - self.failing[check_id]) * rule.weight
+        return dict(zip(BANDS, np.bincount(_band_codes(scores), minlength=len(BANDS)).tolist()))
+
+
+_what_ifs = {}
+_what_ifs_lock = threading.Lock()
+
+
+def get_what_if(plan, history_dir=CHECKS_HISTORY_DIR, directory=RESCORING_DIR, refresh=False):
+    """Process-wide what-if index, rebuilt when the rule plan changes or on `refresh`"""
+    with _what_ifs_lock:
+        what_if = _what_ifs.get(history_dir)
+        if what_if is None or refresh or what_if.plan is not plan:
+            segments = CheckHistoryLog(history_dir).segments()
+            if what_if is None or refresh:
+                refresh_inputs(segments, directory)
+                columns = read_input_columns(segments, directory)
+            else:
+                columns = what_if.columns
+            what_if = _what_ifs[history_dir] = ThresholdWhatIf(columns, plan)
+        return what_if